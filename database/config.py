@@ -0,0 +1,46 @@
+"""
+Connection settings for the database scripts.
+Reads the same LOCAL_DB_* variables as src/config.py and builds one DSN.
+"""
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DB_NAME = os.environ.get("LOCAL_DB_NAME", "ecommerce_db")
+DB_USER = os.environ.get("LOCAL_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("LOCAL_DB_PASSWORD", "datalens")
+DB_HOST = os.environ.get("LOCAL_DB_HOST", "localhost")
+DB_PORT = int(os.environ.get("LOCAL_DB_PORT", "5432"))
+
+APPLICATION_NAME = "ecommerce_agent"
+
+# Throwaway test databases skip WAL by creating tables UNLOGGED
+ECOM_ENV = os.environ.get("ECOM_ENV", "development")
+USE_UNLOGGED_TABLES = ECOM_ENV == "test"
+
+def _dsn_value(value) -> str:
+    """Quote a value for a libpq keyword/value connection string"""
+    escaped = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+def build_dsn(database: str = DB_NAME) -> str:
+    """
+    Build a libpq keyword/value connection string for the given database.
+    
+    Keyword/value form takes any host as-is (including IPv6 addresses such as
+    ::1, which a URI would need to bracket). Settings not given here, such as
+    sslmode, still come from the usual PG* environment variables.
+    """
+    settings = {
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "dbname": database,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "application_name": APPLICATION_NAME,
+    }
+    return " ".join(f"{key}={_dsn_value(value)}" for key, value in settings.items())
+
+DSN = build_dsn()
@@ -7,24 +7,25 @@ from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from pathlib import Path
 import sys
 
-# Database configuration
-DB_NAME = "ecommerce_db"
-DB_USER = "postgres"  # Default PostgreSQL user
-DB_PASSWORD = "datalens"  # Your password
-DB_HOST = "localhost"
-DB_PORT = 5432
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import DB_NAME, DB_USER, DB_HOST, DB_PORT, USE_UNLOGGED_TABLES, build_dsn
+from pool import get_conn, close_pool
+
+# Transaction-local settings for the one-off bulk load (durability is not needed
+# here, and SET LOCAL keeps them from leaking onto the pooled connection)
+INIT_SESSION_SETTINGS = (
+    "SET LOCAL synchronous_commit = off; "
+    "SET LOCAL work_mem = '64MB'; "
+    "SET LOCAL maintenance_work_mem = '512MB'; "
+    "SET LOCAL client_min_messages = WARNING;"
+)
 
 def create_database():
     """Create database if it doesn't exist"""
     try:
         # Connect to PostgreSQL server (default postgres database)
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database="postgres"  # Connect to default database first
-        )
+        conn = psycopg2.connect(build_dsn("postgres"))  # Connect to default database first
         conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         cursor = conn.cursor()
         
@@ -47,15 +48,19 @@ def create_database():
         print(f"[ERROR] Failed to create database: {e}")
         return False
 
-def run_sql_file(conn, file_path: Path):
-    """Run SQL file"""
+def run_sql_file(conn, file_path: Path, commit: bool = True, unlogged: bool = False):
+    """Run SQL file (commit=False leaves the transaction open for the caller)"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            sql = f.read()
+        # Sent to the server as raw bytes: no decode to str and re-encode in the driver
+        sql = file_path.read_bytes()
+        
+        if unlogged:
+            sql = sql.replace(b"CREATE TABLE", b"CREATE UNLOGGED TABLE")
         
         cursor = conn.cursor()
         cursor.execute(sql)
-        conn.commit()
+        if commit:
+            conn.commit()
         cursor.close()
         print(f"[INFO] Executed {file_path.name}")
         return True
@@ -69,42 +74,50 @@ def initialize_database():
     if not create_database():
         return False
     
-    # Connect to the new database
+    # Borrow a connection to the new database from the pool
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        
-        # Get SQL files
-        db_dir = Path(__file__).parent
-        schema_file = db_dir / "schema.sql"
-        seed_file = db_dir / "seed_data.sql"
-        
-        # Run schema
-        if schema_file.exists():
-            print(f"\n[INFO] Running schema...")
-            if not run_sql_file(conn, schema_file):
-                conn.close()
+        with get_conn() as conn:
+            # Tune the transaction for bulk loading
+            cursor = conn.cursor()
+            cursor.execute(INIT_SESSION_SETTINGS)
+            cursor.close()
+            
+            # Get SQL files
+            db_dir = Path(__file__).parent
+            schema_file = db_dir / "schema.sql"
+            seed_file = db_dir / "seed_data.sql"
+            
+            # Run schema and seed data in a single transaction
+            if schema_file.exists():
+                print(f"\n[INFO] Running schema...")
+                if USE_UNLOGGED_TABLES:
+                    print(f"[INFO] ECOM_ENV=test: creating tables as UNLOGGED")
+                if not run_sql_file(conn, schema_file, commit=False, unlogged=USE_UNLOGGED_TABLES):
+                    conn.rollback()
+                    return False
+            else:
+                print(f"[ERROR] Schema file not found: {schema_file}")
+                conn.rollback()
                 return False
-        else:
-            print(f"[ERROR] Schema file not found: {schema_file}")
-            conn.close()
-            return False
+            
+            # Run seed data
+            if seed_file.exists():
+                print(f"\n[INFO] Running seed data...")
+                if not run_sql_file(conn, seed_file, commit=False):
+                    conn.rollback()
+                    return False
+            else:
+                print(f"[WARNING] Seed data file not found: {seed_file}")
+            
+            conn.commit()
+            
+            # Refresh planner statistics (VACUUM cannot run inside a transaction)
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("VACUUM ANALYZE")
+            cursor.close()
+            print(f"[INFO] Vacuumed and analyzed tables")
         
-        # Run seed data
-        if seed_file.exists():
-            print(f"\n[INFO] Running seed data...")
-            if not run_sql_file(conn, seed_file):
-                conn.close()
-                return False
-        else:
-            print(f"[WARNING] Seed data file not found: {seed_file}")
-        
-        conn.close()
         print(f"\n[INFO] Database initialization complete!")
         return True
         
@@ -118,6 +131,7 @@ if __name__ == "__main__":
     print("="*60)
     
     success = initialize_database()
+    close_pool()
     
     if success:
         print("\n[SUCCESS] Database ready for use!")
@@ -1,109 +1,145 @@
 """
 Insert seed data directly into database
 """
-import psycopg2
-from psycopg2.extras import execute_values
+import csv
+import io
+import os
 import uuid
 from datetime import datetime, timedelta
+from pathlib import Path
+import sys
 
-DB_NAME = "ecommerce_db"
-DB_USER = "postgres"
-DB_PASSWORD = "datalens"
-DB_HOST = "localhost"
-DB_PORT = 5432
+sys.path.insert(0, str(Path(__file__).parent))
+
+from pool import get_conn, close_pool
+
+USER_COLUMNS = ("id", "email", "name", "verified", "loyalty_tier", "loyalty_points")
+PRODUCT_COLUMNS = ("id", "name", "description", "category", "subcategory", "price", "compare_at_price", "sku", "status")
+ORDER_COLUMNS = ("id", "user_id", "order_number", "status", "payment_status", "payment_method", "subtotal", "tax",
+                 "shipping_cost", "total_amount", "tracking_number", "carrier", "estimated_delivery")
+# Orders are staged with the owner's email; user_id is resolved server-side
+ORDER_STAGING_COLUMNS = tuple("owner_email" if column == "user_id" else column for column in ORDER_COLUMNS)
+
+def _bulk_uuids(n: int) -> list:
+    """Generate n random (version 4) UUID strings from a single os.urandom call"""
+    raw = bytearray(os.urandom(16 * n))
+    ids = []
+    for i in range(0, 16 * n, 16):
+        raw[i + 6] = (raw[i + 6] & 0x0F) | 0x40  # version 4
+        raw[i + 8] = (raw[i + 8] & 0x3F) | 0x80  # RFC 4122 variant
+        ids.append(str(uuid.UUID(bytes=bytes(raw[i:i + 16]))))
+    return ids
+
+def copy_to_staging(cursor, table: str, columns, rows, extra_columns: str = "") -> str:
+    """
+    COPY rows into a temp staging table shaped like `table`.
+    
+    The caller moves them with INSERT ... SELECT ... ON CONFLICT, which COPY
+    itself cannot express. The staging table is dropped on commit.
+    `extra_columns` (e.g. ", owner_email TEXT") adds staging-only columns.
+    """
+    staging = f"staging_{table}"
+    cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS{extra_columns}) ON COMMIT DROP")
+    
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH CSV", buf)
+    return staging
+
+def insert_from_staging(cursor) -> tuple:
+    """
+    Move all staged users, products and orders into place in one statement.
+    
+    Each table is an INSERT ... ON CONFLICT DO NOTHING in a data-modifying
+    CTE; orders get their user_id by joining the owner email against both
+    the users inserted here and the ones that already existed.
+    
+    Returns:
+        (users, products, orders) inserted counts
+    """
+    user_columns = ", ".join(USER_COLUMNS)
+    product_columns = ", ".join(PRODUCT_COLUMNS)
+    order_columns = ", ".join(ORDER_COLUMNS)
+    order_values = ", ".join("owners.id" if column == "user_id" else f"s.{column}" for column in ORDER_COLUMNS)
+    cursor.execute(f"""
+        WITH new_users AS (
+            INSERT INTO users ({user_columns}) SELECT {user_columns} FROM staging_users
+            ON CONFLICT (email) DO NOTHING RETURNING email, id
+        ), new_products AS (
+            INSERT INTO products ({product_columns}) SELECT {product_columns} FROM staging_products
+            ON CONFLICT DO NOTHING RETURNING id
+        ), owners AS (
+            -- Rows inserted by new_users are not visible to this statement's view of users
+            SELECT email, id FROM new_users
+            UNION ALL
+            SELECT email, id FROM users WHERE email IN (SELECT owner_email FROM staging_orders)
+        ), new_orders AS (
+            INSERT INTO orders ({order_columns})
+            SELECT {order_values} FROM staging_orders s JOIN owners ON owners.email = s.owner_email
+            ON CONFLICT DO NOTHING RETURNING id
+        )
+        SELECT (SELECT count(*) FROM new_users),
+               (SELECT count(*) FROM new_products),
+               (SELECT count(*) FROM new_orders)
+    """)
+    return cursor.fetchone()
 
 def insert_seed_data():
     """Insert seed data"""
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME
-    )
+    with get_conn() as conn:
+        return _insert_seed_data(conn)
+
+def _insert_seed_data(conn):
+    """Insert seed data using the given connection"""
     cursor = conn.cursor()
     
     try:
-        # Check if data exists
-        cursor.execute("SELECT COUNT(*) FROM users")
-        if cursor.fetchone()[0] > 0:
-            print("[INFO] Data already exists. Skipping.")
-            return True
-        
+        # Existing rows are skipped server-side by ON CONFLICT DO NOTHING
         print("[INFO] Inserting seed data...")
         
-        # Insert users
-        users = [
-            (str(uuid.uuid4()), 'john@example.com', 'John Doe', True, 'silver', 750),
-            (str(uuid.uuid4()), 'sarah@example.com', 'Sarah Smith', True, 'gold', 2500),
-            (str(uuid.uuid4()), 'mike@example.com', 'Mike Johnson', True, 'bronze', 300),
-            (str(uuid.uuid4()), 'lisa@example.com', 'Lisa Brown', True, 'silver', 1200),
-            (str(uuid.uuid4()), 'david@example.com', 'David Wilson', True, 'bronze', 200),
-            (str(uuid.uuid4()), 'emily@example.com', 'Emily Davis', True, 'platinum', 6000),
-            (str(uuid.uuid4()), 'james@example.com', 'James Miller', True, 'gold', 3000),
-            (str(uuid.uuid4()), 'jane@example.com', 'Jane Anderson', True, 'silver', 1500),
-            (str(uuid.uuid4()), 'bob@example.com', 'Bob Taylor', True, 'bronze', 100),
-            (str(uuid.uuid4()), 'alice@example.com', 'Alice Martinez', True, 'gold', 2800),
-            (str(uuid.uuid4()), 'charlie@example.com', 'Charlie Garcia', True, 'silver', 900),
-            (str(uuid.uuid4()), 'test@example.com', 'Test User', True, 'bronze', 500),
-            (str(uuid.uuid4()), 'ahmedyaqoobbusiness@gmail.com', 'Ahmed Yaqoob', True, 'gold', 2000),
+        # Users
+        user_data = [
+            ('john@example.com', 'John Doe', True, 'silver', 750),
+            ('sarah@example.com', 'Sarah Smith', True, 'gold', 2500),
+            ('mike@example.com', 'Mike Johnson', True, 'bronze', 300),
+            ('lisa@example.com', 'Lisa Brown', True, 'silver', 1200),
+            ('david@example.com', 'David Wilson', True, 'bronze', 200),
+            ('emily@example.com', 'Emily Davis', True, 'platinum', 6000),
+            ('james@example.com', 'James Miller', True, 'gold', 3000),
+            ('jane@example.com', 'Jane Anderson', True, 'silver', 1500),
+            ('bob@example.com', 'Bob Taylor', True, 'bronze', 100),
+            ('alice@example.com', 'Alice Martinez', True, 'gold', 2800),
+            ('charlie@example.com', 'Charlie Garcia', True, 'silver', 900),
+            ('test@example.com', 'Test User', True, 'bronze', 500),
+            ('ahmedyaqoobbusiness@gmail.com', 'Ahmed Yaqoob', True, 'gold', 2000),
         ]
+        users = [(user_id, *data) for user_id, data in zip(_bulk_uuids(len(user_data)), user_data)]
         
-        execute_values(
-            cursor,
-            """INSERT INTO users (id, email, name, verified, loyalty_tier, loyalty_points) 
-               VALUES %s ON CONFLICT (email) DO NOTHING""",
-            users
-        )
-        
-        print(f"[OK] Inserted {len(users)} users")
-        
-        # Get user IDs for orders
-        cursor.execute("SELECT id, email FROM users WHERE email = 'john@example.com'")
-        john_result = cursor.fetchone()
-        john_id = john_result[0] if john_result else None
-        
-        cursor.execute("SELECT id, email FROM users WHERE email = 'sarah@example.com'")
-        sarah_result = cursor.fetchone()
-        sarah_id = sarah_result[0] if sarah_result else None
-        
-        cursor.execute("SELECT id, email FROM users WHERE email = 'ahmedyaqoobbusiness@gmail.com'")
-        ahmed_result = cursor.fetchone()
-        ahmed_id = ahmed_result[0] if ahmed_result else None
-        
-        # Insert products
+        # Products
         products = [
             ('660e8400-e29b-41d4-a716-446655440001', 'Mens Classic Blue Shirt', 'Premium cotton shirt', 'Mens Clothing', 'Shirts', 49.99, 59.99, 'MENS-SHIRT-BLUE-001', 'active'),
             ('660e8400-e29b-41d4-a716-446655440002', 'Mens White Dress Shirt', 'Formal white dress shirt', 'Mens Clothing', 'Shirts', 59.99, 69.99, 'MENS-SHIRT-WHITE-001', 'active'),
             ('660e8400-e29b-41d4-a716-446655440003', 'Mens Blue Jeans', 'Classic fit blue denim jeans', 'Mens Clothing', 'Jeans', 79.99, 89.99, 'MENS-JEANS-BLUE-001', 'active'),
         ]
         
-        execute_values(
-            cursor,
-            """INSERT INTO products (id, name, description, category, subcategory, price, compare_at_price, sku, status) 
-               VALUES %s ON CONFLICT DO NOTHING""",
-            products
-        )
-        
-        print(f"[OK] Inserted {len(products)} products")
+        # Orders, owned by email (orders whose owner does not exist are skipped)
+        orders = [
+            ('880e8400-e29b-41d4-a716-446655440001', 'john@example.com', 'ORD-12345', 'shipped', 'captured', 'Credit Card', 49.99, 4.00, 5.99, 59.98, 'TRACK123456789', 'FedEx', datetime.now() + timedelta(days=3)),
+            ('880e8400-e29b-41d4-a716-446655440002', 'sarah@example.com', 'ORD-67890', 'delivered', 'captured', 'PayPal', 89.99, 7.20, 0.00, 97.19, 'TRACK987654321', 'UPS', datetime.now() - timedelta(days=2)),
+            ('880e8400-e29b-41d4-a716-446655440003', 'ahmedyaqoobbusiness@gmail.com', 'ORD-12345', 'shipped', 'captured', 'Credit Card', 49.99, 4.00, 5.99, 59.98, 'TRACK123456789', 'FedEx', datetime.now() + timedelta(days=3)),
+        ]
         
-        # Insert orders
-        orders = []
-        if john_id:
-            orders.append(('880e8400-e29b-41d4-a716-446655440001', john_id, 'ORD-12345', 'shipped', 'captured', 'Credit Card', 49.99, 4.00, 5.99, 59.98, 'TRACK123456789', 'FedEx', datetime.now() + timedelta(days=3)))
-        if sarah_id:
-            orders.append(('880e8400-e29b-41d4-a716-446655440002', sarah_id, 'ORD-67890', 'delivered', 'captured', 'PayPal', 89.99, 7.20, 0.00, 97.19, 'TRACK987654321', 'UPS', datetime.now() - timedelta(days=2)))
-        if ahmed_id:
-            orders.append(('880e8400-e29b-41d4-a716-446655440003', ahmed_id, 'ORD-12345', 'shipped', 'captured', 'Credit Card', 49.99, 4.00, 5.99, 59.98, 'TRACK123456789', 'FedEx', datetime.now() + timedelta(days=3)))
+        copy_to_staging(cursor, "users", USER_COLUMNS, users)
+        copy_to_staging(cursor, "products", PRODUCT_COLUMNS, products)
+        copy_to_staging(cursor, "orders", ORDER_STAGING_COLUMNS, orders, extra_columns=", owner_email TEXT")
         
-        execute_values(
-            cursor,
-            """INSERT INTO orders (id, user_id, order_number, status, payment_status, payment_method, subtotal, tax, shipping_cost, total_amount, tracking_number, carrier, estimated_delivery) 
-               VALUES %s ON CONFLICT DO NOTHING""",
-            orders
-        )
+        # One round trip for all three tables
+        user_count, product_count, order_count = insert_from_staging(cursor)
         
-        print(f"[OK] Inserted {len(orders)} orders")
+        print(f"[OK] Inserted {user_count} users ({len(users) - user_count} already existed)")
+        print(f"[OK] Inserted {product_count} products ({len(products) - product_count} already existed)")
+        print(f"[OK] Inserted {order_count} orders ({len(orders) - order_count} skipped)")
         
         conn.commit()
         print("[SUCCESS] Seed data inserted successfully!")
@@ -117,12 +153,12 @@ def insert_seed_data():
         return False
     finally:
         cursor.close()
-        conn.close()
 
 if __name__ == "__main__":
     print("="*60)
     print("Inserting Seed Data")
     print("="*60)
     insert_seed_data()
+    close_pool()
 
 
@@ -0,0 +1,42 @@
+"""
+Shared PostgreSQL connection pool for the database scripts
+"""
+from contextlib import contextmanager
+from psycopg2.pool import SimpleConnectionPool
+
+from config import DSN
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+
+_pool = None
+
+def get_pool() -> SimpleConnectionPool:
+    """Create the module-wide pool on first use"""
+    global _pool
+    if _pool is None:
+        _pool = SimpleConnectionPool(
+            POOL_MIN_CONN,
+            POOL_MAX_CONN,
+            DSN
+        )
+    return _pool
+
+@contextmanager
+def get_conn():
+    """Borrow a connection from the pool and always hand it back"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed and conn.autocommit:
+            conn.autocommit = False
+        pool.putconn(conn)
+
+def close_pool():
+    """Close every pooled connection"""
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
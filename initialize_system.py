@@ -2,7 +2,10 @@
 System Initialization and Verification Script
 Verifies configuration, builds graph, tests connections, and runs quick test
 """
+import io
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # Add src to path
@@ -13,9 +16,31 @@ from src.config import (
     DATA_DIR, GRAPH_DIR, POLICIES_PATH, ENTITIES_PATH
 )
 from src.minirag.graph_builder import MiniRAGGraphBuilder
-from src.tools.database_tool import DatabaseTool
+from src.tools.database_tool import get_db
 from src.agent.ecommerce_agent import ECommerceAgent
 
+class _ThreadOutput(io.TextIOBase):
+    """stdout proxy that lets worker threads buffer their output separately"""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.stream).write(text)
+    
+    def flush(self):
+        self.stream.flush()
+
+def _run_buffered(output: _ThreadOutput, step):
+    """Run a step, returning its result together with everything it printed"""
+    output.local.buffer = io.StringIO()
+    try:
+        return step(), output.local.buffer.getvalue()
+    finally:
+        output.local.buffer = None
+
 def print_header(text):
     """Print formatted header"""
     print("\n" + "="*60)
@@ -70,7 +95,7 @@ def test_database():
     print_header("[2/4] Database Connection Test")
     
     try:
-        db = DatabaseTool()
+        db = get_db()
         
         # Test user lookup
         test_email = "john@example.com"
@@ -178,15 +203,28 @@ def main():
         print("\n[WARNING] Configuration issues found. Please fix before continuing.")
         return
     
-    # Step 2: Test database
-    results["database"] = test_database()
-    if not results["database"]:
-        print("\n[WARNING] Database not ready. Run: python database/init_database.py")
-    
-    # Step 3: Build graph
-    results["graph"] = build_graph()
-    if not results["graph"]:
-        print("\n[WARNING] Graph build failed. Check knowledge base files.")
+    # Steps 2 and 3 are independent: test the database while the graph builds.
+    # Each step's output is buffered and printed whole once it finishes.
+    warnings = {
+        "database": "\n[WARNING] Database not ready. Run: python database/init_database.py",
+        "graph": "\n[WARNING] Graph build failed. Check knowledge base files."
+    }
+    output = _ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                executor.submit(_run_buffered, output, test_database): "database",
+                executor.submit(_run_buffered, output, build_graph): "graph"
+            }
+            for future in as_completed(futures):
+                component = futures[future]
+                results[component], step_output = future.result()
+                print(step_output, end="")
+                if not results[component]:
+                    print(warnings[component])
+    finally:
+        sys.stdout = output.stream
     
     # Step 4: Test agent (only if graph is built)
     if results["graph"]:
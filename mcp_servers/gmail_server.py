@@ -5,6 +5,7 @@ Uses simple JSON-RPC over stdio
 """
 import sys
 import logging
+from functools import lru_cache
 from pathlib import Path
 
 # Redirect all logging to stderr to avoid interfering with JSON-RPC on stdout
@@ -20,25 +21,27 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from src.tools.gmail_tool import GmailTool
 from mcp_servers.simple_rpc_server import SimpleRPCServer
 
-# Initialize Gmail tool
-gmail_tool = GmailTool()
+@lru_cache(maxsize=1)
+def _tool() -> GmailTool:
+    """Gmail tool, created on first use so startup does not wait on SMTP setup"""
+    return GmailTool()
 
 # Define handlers
 def send_2fa_code(email: str, purpose: str = "verification"):
     """Send 2FA code"""
-    return gmail_tool.send_2fa_code(email, purpose)
+    return _tool().send_2fa_code(email, purpose)
 
 def verify_2fa_code(email: str, code: str):
     """Verify 2FA code"""
-    return gmail_tool.verify_2fa_code(email, code)
+    return _tool().verify_2fa_code(email, code)
 
 def send_notification(email: str, notification_type: str, data: dict):
     """Send notification"""
-    return gmail_tool.send_notification(email, notification_type, data)
+    return _tool().send_notification(email, notification_type, data)
 
 def cleanup_expired_codes():
     """Cleanup expired codes"""
-    gmail_tool.cleanup_expired_codes()
+    _tool().cleanup_expired_codes()
     return {"success": True, "message": "Expired codes cleaned up"}
 
 # Create server with handlers
@@ -5,6 +5,7 @@ Uses simple JSON-RPC over stdio
 """
 import sys
 import logging
+from functools import lru_cache
 from pathlib import Path
 
 # Redirect all logging to stderr to avoid interfering with JSON-RPC on stdout
@@ -24,65 +25,49 @@ from src.config import (
 from src.tools.database_tool import DatabaseTool
 from mcp_servers.simple_rpc_server import SimpleRPCServer
 
-# Initialize database tool
-db_tool = DatabaseTool()
-
-# Helper to serialize datetime, date, and Decimal objects
-def serialize_datetime(obj):
-    """Convert datetime, date, and Decimal objects to JSON-serializable types"""
-    from datetime import datetime, date
-    from decimal import Decimal
-    
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: serialize_datetime(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime(item) for item in obj]
-    return obj
+@lru_cache(maxsize=1)
+def _tool() -> DatabaseTool:
+    """Database tool, created on first use so startup does not wait on a connection"""
+    return DatabaseTool()
 
 # Define handlers
 def get_user_by_email(email: str):
     """Get user by email"""
-    user = db_tool.get_user_by_email(email)
+    user = _tool().get_user_by_email(email)
     if user:
-        return serialize_datetime(user)
+        return user
     return {"error": "User not found"}
 
 def get_user_orders(user_id: str, limit: int = 10):
     """Get user orders"""
-    orders = db_tool.get_user_orders(user_id, limit)
-    return serialize_datetime(orders)
+    return _tool().get_user_orders(user_id, limit)
 
 def get_order_by_id(order_id: str):
     """Get order by ID"""
-    order = db_tool.get_order_by_id(order_id)
+    order = _tool().get_order_by_id(order_id)
     if order:
-        return serialize_datetime(order)
+        return order
     return {"error": "Order not found"}
 
 def get_user_email_from_order(order_number: str):
     """Get user email from order"""
-    email = db_tool.get_user_email_from_order(order_number)
+    email = _tool().get_user_email_from_order(order_number)
     return {"email": email} if email else {"error": "Order not found"}
 
 def search_orders_by_status(status: str, limit: int = 20):
     """Search orders by status"""
-    orders = db_tool.search_orders_by_status(status, limit)
-    return serialize_datetime(orders)
+    return _tool().search_orders_by_status(status, limit)
 
 def update_order_status(order_id: str, status: str):
     """Update order status"""
-    success = db_tool.update_order_status(order_id, status)
+    success = _tool().update_order_status(order_id, status)
     return {"success": success}
 
 def create_user(email: str, name: str):
     """Create user"""
-    user = db_tool.create_user(email, name)
+    user = _tool().create_user(email, name)
     if user:
-        return serialize_datetime(user)
+        return user
     return {"error": "Failed to create user"}
 
 def get_database_info():
@@ -107,6 +92,7 @@ handlers = {
 }
 
 if __name__ == "__main__":
-    server = SimpleRPCServer(handlers)
+    # get_database_info only reports configuration, so its response is cached
+    server = SimpleRPCServer(handlers, constant_methods={"get_database_info"})
     server.run()
 
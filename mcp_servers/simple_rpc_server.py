@@ -1,33 +1,83 @@
 """
 Simple RPC Server for MCP-style communication
 Uses JSON-RPC over stdio for simplicity and reliability
+
+Messages are framed LSP-style: a "Content-Length: <n>" header, a blank
+line, then exactly n bytes of JSON. Bare newline-delimited JSON requests
+are still accepted.
 """
 import sys
 import json
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Database values (Decimal, datetime, UUID) are converted by src.json_utils.json_default
+from src.json_utils import dumps as _dumps, loads as _loads
+
+def frame(body: bytes) -> bytes:
+    """Prefix a JSON body with its Content-Length header"""
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+def read_frame(stream, first_line: bytes) -> bytes:
+    """
+    Read the rest of a framed message whose header line has already been read.
+    
+    Args:
+        stream: Binary stream positioned after `first_line`
+        first_line: The "Content-Length: <n>" header line
+    
+    Returns:
+        The message body (may be short if the stream ended early)
+    """
+    length = int(first_line.split(b":", 1)[1])
+    # Skip any further headers up to the blank separator line
+    while stream.readline().strip():
+        pass
+    return stream.read(length)
 
 class SimpleRPCServer:
     """Simple RPC server using JSON-RPC over stdio"""
     
-    def __init__(self, handlers: Dict[str, callable]):
-        self.handlers = handlers
+    def __init__(self, handlers: Dict[str, callable], constant_methods: Optional[set] = None):
+        """
+        Args:
+            handlers: Method name to handler mapping
+            constant_methods: Methods whose result never changes; their serialized
+                result is computed on first call and reused afterwards
+        """
+        # Private copy so the dispatch table cannot change under a running server
+        self.handlers = dict(handlers)
+        self.constant_methods = frozenset(constant_methods or ())
+        self._constant_results: Dict[str, bytes] = {}
     
     def run(self):
         """Run the server, reading from stdin and writing to stdout"""
+        stdin = sys.stdin.buffer
         while True:
+            request = None
             try:
-                # Read request from stdin
-                line = sys.stdin.readline()
+                # Read request from stdin (bytes end-to-end)
+                line = stdin.readline()
                 if not line:
                     break
+                if not line.strip():
+                    continue
+                
+                if line.startswith(b"Content-Length:"):
+                    body = read_frame(stdin, line)
+                else:
+                    body = line.strip()  # newline-delimited request
                 
-                request = json.loads(line.strip())
+                request = _loads(body)
                 
                 # Handle request
                 response = self._handle_request(request)
                 
                 # Write response to stdout
-                print(json.dumps(response), flush=True)
+                self._write(response)
             
             except json.JSONDecodeError:
                 error_response = {
@@ -35,40 +85,68 @@ class SimpleRPCServer:
                     "id": None,
                     "error": {"code": -32700, "message": "Parse error"}
                 }
-                print(json.dumps(error_response), flush=True)
+                self._write(error_response)
             
             except Exception as e:
                 error_response = {
                     "jsonrpc": "2.0",
-                    "id": request.get("id") if 'request' in locals() else None,
+                    "id": request.get("id") if isinstance(request, dict) else None,
                     "error": {"code": -32603, "message": str(e)}
                 }
-                print(json.dumps(error_response), flush=True)
+                self._write(error_response)
+    
+    def _write(self, response: Union[Dict[str, Any], bytes]):
+        """Write one Content-Length framed response (a dict or an already serialized envelope) to stdout"""
+        if not isinstance(response, bytes):
+            response = _dumps(response)
+        # Flush any text printed by handlers first so it cannot land mid-response
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        out.write(frame(response))
+        out.flush()
     
-    def _handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    def _constant_response(self, method: str, request_id: Any) -> bytes:
+        """Splice the cached result bytes of a constant method into a response envelope"""
+        result = self._constant_results.get(method)
+        if result is None:
+            result = self._constant_results[method] = _dumps(self.handlers[method]())
+        return b'{"jsonrpc":"2.0","id":' + _dumps(request_id) + b',"result":' + result + b'}'
+    
+    def _handle_request(self, request: Dict[str, Any]) -> Union[Dict[str, Any], bytes]:
         """Handle a JSON-RPC request"""
         method = request.get("method")
         params = request.get("params", {})
         request_id = request.get("id")
         
-        if method in self.handlers:
+        if method in self.constant_methods and not params:
             try:
-                result = self.handlers[method](**params)
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": result
-                }
+                return self._constant_response(method, request_id)
             except Exception as e:
                 return {
                     "jsonrpc": "2.0",
                     "id": request_id,
                     "error": {"code": -32603, "message": str(e)}
                 }
-        else:
+        
+        handler = self.handlers.get(method)
+        if handler is None:
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "error": {"code": -32601, "message": f"Method not found: {method}"}
             }
+        
+        try:
+            result = handler(**params) if params else handler()
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": result
+            }
+        except Exception as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {"code": -32603, "message": str(e)}
+            }
 
@@ -0,0 +1,85 @@
+"""
+Small in-process caches for the agent layer
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Filler words that do not change what is being asked
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "please", "pls", "can", "could", "would", "you", "tell", "me",
+    "i", "to", "know", "want", "do", "does", "hi", "hello", "hey", "thanks", "thank",
+    "is", "are", "what's", "whats", "what", "your"
+})
+
+def query_signature(query: str) -> Tuple[str, ...]:
+    """
+    Normalize a question so near-duplicates share a cache key.
+    
+    Lowercases, drops punctuation and filler words, and sorts the remaining
+    words, so "What is your return policy?" and "return policy please" match.
+    """
+    words = _WORD_PATTERN.findall(query.lower())
+    return tuple(sorted({word for word in words if word not in _FILLER_WORDS}))
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed TTL.
+    
+    Backed by an OrderedDict: hits move an entry to the end, and inserting
+    past maxsize evicts from the front (least recently used).
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        """Remove and return an entry (expired or not)"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry is not None else default
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Current size and hit/miss counts since creation"""
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+    
+    def __len__(self) -> int:
+        return len(self._data)
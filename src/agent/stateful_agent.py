@@ -17,7 +17,7 @@ from datetime import datetime
 from ..config import OPENAI_API_KEY, LLM_MODEL, MAX_ITERATIONS
 from ..minirag.graph_retriever import MiniRAGRetriever
 from ..tools.gmail_tool import GmailTool
-from ..tools.database_tool import DatabaseTool
+from ..tools.database_tool import get_db
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,6 +33,18 @@ class AgentState(TypedDict):
     retrieved_context: List[Dict[str, Any]]
     conversation_summary: str  # Summary of conversation for context
 
+def _is_final_ai_message(msg: BaseMessage) -> bool:
+    """An AI message that answers rather than requests tool calls"""
+    return isinstance(msg, AIMessage) and not msg.tool_calls
+
+def _is_complete(state: Dict[str, Any]) -> bool:
+    """The workflow is done once it ends on a substantive final AI answer"""
+    messages = state.get("messages", [])
+    if not messages:
+        return False
+    last_msg = messages[-1]
+    return _is_final_ai_message(last_msg) and len(last_msg.content or "") > 10
+
 class StatefulECommerceAgent:
     """
     Stateful agent with proper LangGraph orchestration.
@@ -47,7 +59,7 @@ class StatefulECommerceAgent:
         )
         self.retriever = MiniRAGRetriever()
         self.gmail_tool = GmailTool()
-        self.database_tool = DatabaseTool()
+        self.database_tool = get_db()
         
         # Create memory for state persistence
         self.memory = MemorySaver()
@@ -88,7 +100,7 @@ class StatefulECommerceAgent:
                         for key, value in content.items():
                             if key.lower() not in ['guardrails', 'metadata', 'technical']:
                                 if isinstance(value, (list, dict)):
-                                    main_content.append(f"{key}: {json.dumps(value, indent=2)}")
+                                    main_content.append(f"{key}: {json.dumps(value, separators=(',', ':'))}")
                                 else:
                                     main_content.append(f"{key}: {value}")
                         content_str = "\n".join(main_content)
@@ -285,7 +297,7 @@ class StatefulECommerceAgent:
         ]
         
         if current_process and process_state:
-            system_parts.append(f"Process State: {json.dumps(process_state, indent=2)}")
+            system_parts.append(f"Process State: {json.dumps(process_state, separators=(',', ':'))}")
         
         system_parts.extend([
             "",
@@ -326,20 +338,18 @@ class StatefulECommerceAgent:
         """Generate final answer"""
         messages = state.get("messages", [])
         
-        # Get last AI message (might already have good response)
+        # One reverse pass: last AI answer (might already be good) and any tool results in the last 10
         last_ai = None
-        for msg in reversed(messages):
-            if isinstance(msg, AIMessage) and not (hasattr(msg, "tool_calls") and msg.tool_calls):
+        has_tool_results = False
+        for i, msg in enumerate(reversed(messages)):
+            if i < 10 and isinstance(msg, ToolMessage):
+                has_tool_results = True
+            elif last_ai is None and _is_final_ai_message(msg):
                 last_ai = msg
+            if last_ai is not None and (has_tool_results or i >= 9):
                 break
         
-        # If we have tool results, format them nicely
-        tool_results = []
-        for msg in messages[-10:]:
-            if isinstance(msg, ToolMessage):
-                tool_results.append(msg.content)
-        
-        if tool_results and last_ai:
+        if has_tool_results and last_ai:
             # LLM already has context from tool results, use its response
             state["messages"].append(AIMessage(content=last_ai.content))
         elif last_ai and last_ai.content:
@@ -386,20 +396,14 @@ class StatefulECommerceAgent:
             for iteration in range(MAX_ITERATIONS):
                 final_state = self.app.invoke(initial_state, config)
                 
-                # Check if we should continue
-                messages = final_state.get("messages", [])
-                last_msg = messages[-1] if messages else None
-                
-                # If last message is final AI response without tool calls, we're done
-                if isinstance(last_msg, AIMessage) and not (hasattr(last_msg, "tool_calls") and last_msg.tool_calls):
-                    if last_msg.content and len(last_msg.content) > 10:
-                        break
+                if _is_complete(final_state):
+                    break
                 
                 # Update initial_state for next iteration
                 initial_state = final_state
                 
         except Exception as e:
-            logger.error(f"Workflow error: {e}", exc_info=True)
+            logger.error("Workflow error: %s", e, exc_info=True)
             final_state = initial_state
         
         # Extract answer
@@ -408,10 +412,9 @@ class StatefulECommerceAgent:
         
         # Get last AI message
         for msg in reversed(messages):
-            if isinstance(msg, AIMessage) and msg.content:
-                if not (hasattr(msg, "tool_calls") and msg.tool_calls):
-                    answer = msg.content
-                    break
+            if _is_final_ai_message(msg) and msg.content:
+                answer = msg.content
+                break
         
         return {
             "answer": answer,
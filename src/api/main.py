@@ -3,6 +3,7 @@ FastAPI Backend for E-Commerce MiniRAG Agentic System
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import uvicorn
@@ -33,6 +34,7 @@ agent = ECommerceAgent()
 class QueryRequest(BaseModel):
     query: str
     user_email: Optional[str] = None
+    thread_id: Optional[str] = None  # conversation id; omit for a one-off (stateless) query
 
 class QueryResponse(BaseModel):
     answer: str
@@ -76,14 +78,33 @@ async def process_query(request: QueryRequest):
     4. Generates final answer
     """
     try:
-        result = agent.process_query(
+        # Awaited off the event loop so concurrent requests overlap their LLM calls
+        result = await agent.aprocess_query(
             query=request.query,
-            user_email=request.user_email
+            user_email=request.user_email,
+            thread_id=request.thread_id
         )
         return QueryResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """
+    Process user query and stream the answer as plain text.
+    
+    Same workflow as /query; generated answers are sent as the LLM produces
+    them, so the first words arrive before the full answer is ready.
+    """
+    return StreamingResponse(
+        agent.astream_query(
+            query=request.query,
+            user_email=request.user_email,
+            thread_id=request.thread_id
+        ),
+        media_type="text/plain"
+    )
+
 @app.post("/build-graph", response_model=BuildGraphResponse)
 async def build_graph(request: BuildGraphRequest = BuildGraphRequest()):
     """
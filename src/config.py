@@ -145,6 +145,10 @@ SEMANTIC_FALLBACK_ENABLED = False  # True MiniRAG: graph-first only
 DB_POOL_SIZE = 10
 DB_MAX_OVERFLOW = 20
 
+# MCP Configuration
+MCP_CALL_TIMEOUT = 2.0  # seconds to wait for a PostgreSQL MCP reply before the direct fallback
+MCP_EMAIL_CALL_TIMEOUT = 30.0  # Gmail MCP calls send mail over SMTP, so they get longer
+
 # Gmail Configuration
 EMAIL_VERIFICATION_EXPIRY = 30  # 30 seconds for 2FA codes (as per requirements)
 NOTIFICATION_ENABLED = True
@@ -158,7 +162,22 @@ API_VERSION = "1.0.0"
 # LangGraph Configuration
 MAX_ITERATIONS = 50
 MEMORY_ENABLED = True
+# Conversation checkpoints: empty keeps them in process memory; a file path stores
+# them in SQLite (needs langgraph-checkpoint-sqlite)
+CHECKPOINT_DB_PATH = os.environ.get("CHECKPOINT_DB_PATH", "")
+REASON_HISTORY_MAX_TOKENS = 2048  # approx. token budget for history sent to the reason step
+RESPONSE_CACHE_SIZE = 1024  # stateless (thread_id=None) answers kept in memory
+RESPONSE_CACHE_TTL = 3600  # seconds
+RETRIEVAL_CACHE_SIZE = 512  # MiniRAG results per (query, k)
+RETRIEVAL_CACHE_TTL = 3600  # seconds
+LLM_CACHE_SIZE = 1024  # reason-step LLM replies per exact prompt
+LLM_CACHE_TTL = 3600  # seconds
+ORDER_CACHE_SIZE = 512  # order lookups per normalized order number
+ORDER_CACHE_TTL = 60  # seconds; short, order status changes outside the agent
+# Share of a policy FAQ's words that must match the top policy title to skip the reason step
+DIRECT_ANSWER_MIN_CONFIDENCE = 0.95
 
 # Evaluation Configuration
 EVALUATION_OUTPUT_DIR = ROOT / "evaluation_results"
 EVALUATION_PLOTS_DIR = EVALUATION_OUTPUT_DIR / "plots"
+EVALUATION_CONCURRENCY = 16  # agent queries in flight during batch evaluation
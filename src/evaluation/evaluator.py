@@ -3,11 +3,16 @@ Evaluator for E-Commerce MiniRAG System
 """
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import json
+import logging
 from pathlib import Path
 import numpy as np
 
 from .metrics import Metrics
+from ..json_utils import loads
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class Evaluator:
@@ -32,11 +37,12 @@ class Evaluator:
     def _load_questions(self) -> Dict[str, Any]:
         """Load evaluation questions"""
         try:
-            with open(self.questions_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(self.questions_path, 'rb') as f:
+                raw = f.read()
+            data = loads(raw)
             return data.get("questions", {})
         except Exception as e:
-            print(f"[ERROR] Failed to load questions: {e}")
+            logger.error("Failed to load questions: %s", e)
             return {}
     
     def evaluate_single_query(
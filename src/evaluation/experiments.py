@@ -3,12 +3,19 @@ Experiment Runner for Comparing RAG Systems
 """
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import json
+import asyncio
+import logging
 from pathlib import Path
 import numpy as np
 
 from .evaluator import Evaluator
 from .metrics import Metrics
+from ..config import EVALUATION_CONCURRENCY
+from ..json_utils import dumps
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class ExperimentRunner:
@@ -47,7 +54,7 @@ class ExperimentRunner:
         Returns:
             Evaluation results
         """
-        print(f"\n[EXPERIMENT] Running {system_name}...")
+        logger.info("[EXPERIMENT] Running %s...", system_name)
         
         results = []
         for i, question_data in enumerate(questions, 1):
@@ -55,7 +62,7 @@ class ExperimentRunner:
             expected_tools = question_data.get("expected_tools", [])
             expected_context = question_data.get("expected_context", [])
             
-            print(f"  Processing question {i}/{len(questions)}: {query[:50]}...")
+            logger.info("  Processing question %s/%s: %.50s...", i, len(questions), query)
             
             start_time = datetime.now()
             
@@ -105,7 +112,7 @@ class ExperimentRunner:
         Returns:
             Evaluation results
         """
-        print(f"\n[EXPERIMENT] Running {system_name}...")
+        logger.info("[EXPERIMENT] Running %s...", system_name)
         
         results = []
         for i, question_data in enumerate(questions, 1):
@@ -113,7 +120,7 @@ class ExperimentRunner:
             expected_tools = question_data.get("expected_tools", [])
             expected_context = question_data.get("expected_context", [])
             
-            print(f"  Processing question {i}/{len(questions)}: {query[:50]}...")
+            logger.info("  Processing question %s/%s: %.50s...", i, len(questions), query)
             
             start_time = datetime.now()
             
@@ -163,7 +170,7 @@ class ExperimentRunner:
         Returns:
             Evaluation results
         """
-        print(f"\n[EXPERIMENT] Running {system_name}...")
+        logger.info("[EXPERIMENT] Running %s...", system_name)
         
         results = []
         db_query_times = []
@@ -173,7 +180,7 @@ class ExperimentRunner:
             expected_tools = question_data.get("expected_tools", [])
             expected_context = question_data.get("expected_context", [])
             
-            print(f"  Processing question {i}/{len(questions)}: {query[:50]}...")
+            logger.info("  Processing question %s/%s: %.50s...", i, len(questions), query)
             
             start_time = datetime.now()
             
@@ -215,6 +222,89 @@ class ExperimentRunner:
         
         return evaluation
     
+    def run_agent_experiment(
+        self,
+        agent,
+        questions: List[Dict[str, Any]],
+        system_name: str = "MiniRAG Agent",
+        concurrency: int = EVALUATION_CONCURRENCY
+    ) -> Dict[str, Any]:
+        """
+        Run experiment against a live ECommerceAgent
+        
+        Questions are sent concurrently through agent.aprocess_query (each on
+        its own stateless thread), at most `concurrency` at a time.
+        
+        Args:
+            agent: ECommerceAgent instance
+            questions: List of questions to test
+            system_name: Name of the system
+            concurrency: Maximum queries in flight
+            
+        Returns:
+            Evaluation results
+        """
+        logger.info("[EXPERIMENT] Running %s (concurrency %s)...", system_name, concurrency)
+        
+        responses = asyncio.run(self._abatch_agent_responses(agent, questions, concurrency))
+        
+        results = []
+        for i, (question_data, response) in enumerate(zip(questions, responses), 1):
+            query = question_data.get("question", "")
+            
+            # Evaluate
+            metrics = self.evaluator.evaluate_single_query(
+                query, response,
+                question_data.get("expected_tools", []),
+                question_data.get("expected_context", [])
+            )
+            
+            results.append({
+                "question_id": question_data.get("id", f"Q{i}"),
+                "query": query,
+                "response": response,
+                "metrics": metrics
+            })
+        
+        # Aggregate results
+        evaluation = self.evaluator.evaluate_system(system_name, results)
+        self.results[system_name] = {
+            "evaluation": evaluation,
+            "detailed_results": results
+        }
+        
+        return evaluation
+    
+    async def _abatch_agent_responses(
+        self,
+        agent,
+        questions: List[Dict[str, Any]],
+        concurrency: int
+    ) -> List[Dict[str, Any]]:
+        """Collect agent responses for all questions, in question order"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_one(i: int, query: str) -> Dict[str, Any]:
+            async with semaphore:
+                logger.info("  Processing question %s/%s: %.50s...", i, len(questions), query)
+                start_time = datetime.now()
+                result = await agent.aprocess_query(query, thread_id=None)
+                end_time = datetime.now()
+            
+            return {
+                "answer": result.get("answer", ""),
+                "context": result.get("context", []),
+                "tools_used": [call.get("tool") for call in result.get("debug_info", {}).get("tool_calls", [])],
+                "response_time": (end_time - start_time).total_seconds(),
+                "start_time": start_time,
+                "end_time": end_time
+            }
+        
+        return await asyncio.gather(*(
+            run_one(i, question_data.get("question", ""))
+            for i, question_data in enumerate(questions, 1)
+        ))
+    
     def run_all_experiments(
         self,
         naive_rag_system,
@@ -234,9 +324,7 @@ class ExperimentRunner:
         Returns:
             Comparison results
         """
-        print("\n" + "="*80)
-        print("RUNNING COMPREHENSIVE EXPERIMENTS")
-        print("="*80)
+        logger.info("RUNNING COMPREHENSIVE EXPERIMENTS")
         
         # Run all experiments
         naive_results = self.run_naive_rag_experiment(naive_rag_system, questions)
@@ -317,8 +405,8 @@ class ExperimentRunner:
         }
     
     def save_results(self, output_path: Path):
-        """Save experiment results to JSON file"""
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, default=str)
-        print(f"\n[INFO] Results saved to {output_path}")
+        """Save experiment results to JSON file (datetimes as ISO 8601, other unknown values as str)"""
+        with open(output_path, 'wb') as f:
+            f.write(dumps(self.results, indent=True, default=str))
+        logger.info("Results saved to %s", output_path)
 
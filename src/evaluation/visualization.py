@@ -6,6 +6,11 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import numpy as np
 import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class ResultsVisualizer:
@@ -29,7 +34,7 @@ class ResultsVisualizer:
             with open(self.results_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"[ERROR] Failed to load results: {e}")
+            logger.error("Failed to load results: %s", e)
             return {}
     
     def plot_comprehensive_scores(self, output_path: Path):
@@ -48,7 +53,7 @@ class ResultsVisualizer:
                 scores.append(data["evaluation"].get("comprehensive_score", 0.0))
         
         if not systems:
-            print("[WARNING] No results to plot")
+            logger.warning("No results to plot")
             return
         
         plt.figure(figsize=(10, 6))
@@ -67,7 +72,7 @@ class ResultsVisualizer:
         plt.tight_layout()
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         plt.close()
-        print(f"[INFO] Plot saved to {output_path}")
+        logger.info("Plot saved to %s", output_path)
     
     def plot_metric_comparison(self, output_path: Path):
         """
@@ -91,7 +96,7 @@ class ResultsVisualizer:
                     metric_data[metric].append(mean)
         
         if not systems:
-            print("[WARNING] No results to plot")
+            logger.warning("No results to plot")
             return
         
         x = np.arange(len(metrics))
@@ -115,7 +120,7 @@ class ResultsVisualizer:
         plt.tight_layout()
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         plt.close()
-        print(f"[INFO] Plot saved to {output_path}")
+        logger.info("Plot saved to %s", output_path)
     
     def plot_response_times(self, output_path: Path):
         """
@@ -137,7 +142,7 @@ class ResultsVisualizer:
                 std_times.append(response_time.get("std", 0.0))
         
         if not systems:
-            print("[WARNING] No results to plot")
+            logger.warning("No results to plot")
             return
         
         plt.figure(figsize=(10, 6))
@@ -156,7 +161,7 @@ class ResultsVisualizer:
         plt.tight_layout()
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         plt.close()
-        print(f"[INFO] Plot saved to {output_path}")
+        logger.info("Plot saved to %s", output_path)
     
     def plot_database_efficiency(self, output_path: Path):
         """
@@ -172,7 +177,7 @@ class ResultsVisualizer:
                 break
         
         if not sota_data:
-            print("[WARNING] No SOTA database efficiency data")
+            logger.warning("No SOTA database efficiency data")
             return
         
         metrics = ["avg_time", "min_time", "max_time", "p95_time", "p99_time"]
@@ -193,7 +198,7 @@ class ResultsVisualizer:
         plt.tight_layout()
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         plt.close()
-        print(f"[INFO] Plot saved to {output_path}")
+        logger.info("Plot saved to %s", output_path)
     
     def create_all_visualizations(self, output_dir: Path):
         """
@@ -209,5 +214,5 @@ class ResultsVisualizer:
         self.plot_response_times(output_dir / "response_times.png")
         self.plot_database_efficiency(output_dir / "database_efficiency.png")
         
-        print(f"\n[INFO] All visualizations saved to {output_dir}")
+        logger.info("All visualizations saved to %s", output_dir)
 
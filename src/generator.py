@@ -19,9 +19,12 @@ Guidelines:
 5. Always be professional and customer-friendly
 """
 
-def generate_answer(query: str, contexts: List[Dict]) -> str:
+GENERATION_ERROR_ANSWER = "I apologize, but I encountered an error generating your answer."
+NO_CONTEXT_ANSWER = "I couldn't find relevant information to answer your question. Please try rephrasing or contact support."
+
+def build_answer_messages(query: str, contexts: List[Dict]) -> List[Dict[str, str]]:
     """
-    Generate answer from retrieved contexts with proper formatting.
+    Build the chat messages that ask the LLM to answer from retrieved contexts.
     Excludes technical details like guardrails and metadata.
     
     Args:
@@ -29,11 +32,8 @@ def generate_answer(query: str, contexts: List[Dict]) -> str:
         contexts: Retrieved contexts from MiniRAG graph
         
     Returns:
-        Generated answer
+        System and user messages as role/content dicts
     """
-    if not contexts:
-        return "I couldn't find relevant information to answer your question. Please try rephrasing or contact support."
-    
     # Format contexts - exclude technical details
     formatted_contexts = []
     for ctx in contexts[:3]:  # Use top 3 contexts
@@ -47,14 +47,14 @@ def generate_answer(query: str, contexts: List[Dict]) -> str:
             for key, value in content.items():
                 # Skip technical/administrative fields
                 if key.lower() not in ['guardrails', 'metadata', 'technical', 'admin', 'internal']:
-                    if isinstance(value, (list, dict)):
-                        # Format lists and dicts nicely
-                        if isinstance(value, list) and value:
-                            user_content.append(f"{key}: {', '.join(str(v) for v in value[:5])}")
-                        else:
-                            user_content.append(f"{key}: {json.dumps(value, indent=2) if isinstance(value, dict) else str(value)}")
+                    # First 5 list items; compact JSON for dicts keeps prompt tokens down
+                    if isinstance(value, list) and value:
+                        formatted = ", ".join(str(v) for v in value[:5])
+                    elif isinstance(value, dict):
+                        formatted = json.dumps(value, separators=(',', ':'))
                     else:
-                        user_content.append(f"{key}: {value}")
+                        formatted = str(value)
+                    user_content.append(f"{key}: {formatted}")
             content_str = "\n".join(user_content)
         else:
             content_str = str(content)
@@ -73,13 +73,29 @@ When generating answers:
 - If the context mentions policies, explain them clearly
 """
     
+    return [
+        {"role": "system", "content": enhanced_prompt},
+        {"role": "user", "content": f"Context Information:\n{context_str}\n\nUser Question: {query}\n\nProvide a helpful, user-friendly answer based on the context:"}
+    ]
+
+def generate_answer(query: str, contexts: List[Dict]) -> str:
+    """
+    Generate answer from retrieved contexts with proper formatting.
+    
+    Args:
+        query: User question
+        contexts: Retrieved contexts from MiniRAG graph
+        
+    Returns:
+        Generated answer
+    """
+    if not contexts:
+        return NO_CONTEXT_ANSWER
+    
     try:
         completion = client.chat.completions.create(
             model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": enhanced_prompt},
-                {"role": "user", "content": f"Context Information:\n{context_str}\n\nUser Question: {query}\n\nProvide a helpful, user-friendly answer based on the context:"}
-            ],
+            messages=build_answer_messages(query, contexts),
             max_tokens=MAX_TOKENS,
             temperature=TEMPERATURE
         )
@@ -87,4 +103,4 @@ When generating answers:
         return completion.choices[0].message.content.strip()
     except Exception as e:
         print(f"[ERROR] Generation failed: {e}")
-        return "I apologize, but I encountered an error generating your answer."
+        return GENERATION_ERROR_ANSWER
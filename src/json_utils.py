@@ -0,0 +1,61 @@
+"""
+JSON encoding shared by the MCP servers and the evaluation tools
+Uses orjson when installed and falls back to the standard json module with the same output
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def json_default(obj: Any) -> Any:
+    """Convert values neither encoder handles the same way natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def loads(data: bytes) -> Any:
+    """Parse JSON from bytes or str"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes, identical with or without orjson.
+    
+    Args:
+        obj: Value to serialize
+        indent: Pretty-print with two-space indentation
+        default: Converter for other types; it is tried after json_default
+    """
+    def convert(value: Any) -> Any:
+        try:
+            return json_default(value)
+        except TypeError:
+            return default(value)
+    
+    if default is None:
+        convert = json_default
+    
+    if ORJSON_AVAILABLE:
+        # Datetimes go through json_default too, so both paths format them with isoformat()
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=convert, option=option)
+    if indent:
+        return json.dumps(obj, default=convert, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, default=convert, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -4,10 +4,16 @@ This is the PRIMARY retrieval mechanism - graph traversal, not semantic search.
 """
 import pickle
 import networkx as nx
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Optional, Set, Tuple
 from pathlib import Path
 from ..config import GRAPH_DIR, GRAPH_RETRIEVAL_TOP_K, GRAPH_TRAVERSAL_DEPTH
 
+# Common e-commerce keywords treated as query entities
+QUERY_KEYWORDS = (
+    "return", "refund", "shipping", "delivery", "payment", "order",
+    "policy", "tracking", "cancel", "exchange", "warranty", "support"
+)
+
 class MiniRAGRetriever:
     """
     True MiniRAG retriever - graph-first architecture.
@@ -16,6 +22,10 @@ class MiniRAGRetriever:
     
     def __init__(self):
         self.graph: nx.MultiDiGraph = None
+        # Lowercased match fields per node, built once per graph object (see _node_index)
+        self._index_graph: Optional[nx.MultiDiGraph] = None
+        self._policy_index: List[Tuple[str, str, str, Set[str]]] = []
+        self._entity_index: List[Tuple[str, str]] = []
         self._load_graph()
     
     def _load_graph(self):
@@ -67,6 +77,36 @@ class MiniRAGRetriever:
         
         return results
     
+    def _node_index(self) -> Tuple[List[Tuple[str, str, str, Set[str]]], List[Tuple[str, str]]]:
+        """
+        Lowercased titles, categories, content keywords and entity names.
+        
+        Built on first use and rebuilt whenever self.graph is replaced, so
+        retrieval does not re-walk every policy's content on each query.
+        
+        Returns:
+            (policy index of (node, title, category, content keywords),
+             entity index of (node, name))
+        """
+        if self._index_graph is not self.graph:
+            policies = []
+            entities = []
+            for node, attrs in self.graph.nodes(data=True):
+                node_type = attrs.get("type")
+                if node_type == "policy":
+                    policies.append((
+                        node,
+                        attrs.get("title", "").lower(),
+                        attrs.get("category", "").lower(),
+                        self._extract_content_keywords(attrs.get("content", {}))
+                    ))
+                elif node_type == "entity":
+                    entities.append((node, attrs.get("name", "").lower()))
+            self._policy_index = policies
+            self._entity_index = entities
+            self._index_graph = self.graph
+        return self._policy_index, self._entity_index
+    
     def _extract_query_entities(self, query: str) -> Set[str]:
         """Extract entities and keywords from query"""
         query_lower = query.lower()
@@ -74,18 +114,13 @@ class MiniRAGRetriever:
         
         # Extract known entity types from graph
         if self.graph:
-            for node, attrs in self.graph.nodes(data=True):
-                if attrs.get("type") == "entity":
-                    entity_name = attrs.get("name", "").lower()
-                    if entity_name in query_lower:
-                        entities.add(entity_name)
+            _, entity_index = self._node_index()
+            for _, entity_name in entity_index:
+                if entity_name in query_lower:
+                    entities.add(entity_name)
         
         # Extract common e-commerce keywords
-        keywords = [
-            "return", "refund", "shipping", "delivery", "payment", "order",
-            "policy", "tracking", "cancel", "exchange", "warranty", "support"
-        ]
-        for keyword in keywords:
+        for keyword in QUERY_KEYWORDS:
             if keyword in query_lower:
                 entities.add(keyword)
         
@@ -98,41 +133,37 @@ class MiniRAGRetriever:
         """
         candidates = []
         query_lower = query.lower()
+        query_words = query_lower.split()
+        policy_index, entity_index = self._node_index()
         
         # Search in policy nodes
-        for node, attrs in self.graph.nodes(data=True):
-            if attrs.get("type") == "policy":
-                score = 0.0
-                
-                # Title match
-                title = attrs.get("title", "").lower()
-                if any(word in title for word in query_lower.split()):
-                    score += 2.0
-                
-                # Category match
-                category = attrs.get("category", "").lower()
-                if category in query_lower:
-                    score += 1.5
-                
-                # Entity match
-                for entity in entities:
-                    if entity in title or entity in category:
-                        score += 1.0
-                
-                # Content keyword match
-                content_keywords = self._extract_content_keywords(attrs.get("content", {}))
-                matching_keywords = sum(1 for word in query_lower.split() if word in content_keywords)
-                score += matching_keywords * 0.5
-                
-                if score > 0:
-                    candidates.append((node, score))
+        for node, title, category, content_keywords in policy_index:
+            score = 0.0
+            
+            # Title match
+            if any(word in title for word in query_words):
+                score += 2.0
+            
+            # Category match
+            if category in query_lower:
+                score += 1.5
+            
+            # Entity match
+            for entity in entities:
+                if entity in title or entity in category:
+                    score += 1.0
+            
+            # Content keyword match
+            matching_keywords = sum(1 for word in query_words if word in content_keywords)
+            score += matching_keywords * 0.5
+            
+            if score > 0:
+                candidates.append((node, score))
         
         # Search in entity nodes
-        for node, attrs in self.graph.nodes(data=True):
-            if attrs.get("type") == "entity":
-                entity_name = attrs.get("name", "").lower()
-                if entity_name in query_lower or any(e in entity_name for e in entities):
-                    candidates.append((node, 1.0))
+        for node, entity_name in entity_index:
+            if entity_name in query_lower or any(e in entity_name for e in entities):
+                candidates.append((node, 1.0))
         
         return candidates
     
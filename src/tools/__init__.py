@@ -3,7 +3,7 @@ Tools module for agentic e-commerce system
 """
 from .gmail_tool import GmailTool
 from .supabase_tool import SupabaseTool
-from .database_tool import DatabaseTool
+from .database_tool import DatabaseTool, get_db
 
-__all__ = ["GmailTool", "SupabaseTool", "DatabaseTool"]
+__all__ = ["GmailTool", "SupabaseTool", "DatabaseTool", "get_db"]
 
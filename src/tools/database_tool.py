@@ -1,10 +1,11 @@
 """
 Unified Database Tool - Supports both Supabase and Local PostgreSQL
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence
 from datetime import datetime
 import json
 import os
+import threading
 
 from ..config import (
     USE_SUPABASE, SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY,
@@ -20,23 +21,120 @@ except ImportError:
 
 try:
     import psycopg2
+    from psycopg2 import sql
     from psycopg2.extras import RealDictCursor
     PSYCOPG2_AVAILABLE = True
 except ImportError:
     PSYCOPG2_AVAILABLE = False
 
+# Hot point lookups, PREPAREd once per local PostgreSQL connection so the
+# server skips parse/plan on every call. Each takes a single text argument:
+# every %s is that argument ($1 in the prepared form).
+PREPARED_QUERIES = {
+    "ecom_user_by_email": "SELECT * FROM users WHERE email = %s LIMIT 1",
+    "ecom_email_from_order": """
+        SELECT u.email
+        FROM orders o
+        JOIN users u ON o.user_id = u.id
+        WHERE o.order_number = %s
+        LIMIT 1
+    """,
+    "ecom_order_by_id": """
+        SELECT 
+            o.*,
+            json_agg(
+                json_build_object(
+                    'id', oi.id,
+                    'product_id', oi.product_id,
+                    'variant_id', oi.variant_id,
+                    'product_name', oi.product_name,
+                    'variant_description', oi.variant_description,
+                    'quantity', oi.quantity,
+                    'unit_price', oi.unit_price,
+                    'total_price', oi.total_price
+                )
+            ) as order_items,
+            json_build_object(
+                'email', u.email,
+                'name', u.name
+            ) as users
+        FROM orders o
+        LEFT JOIN order_items oi ON o.id = oi.order_id
+        LEFT JOIN users u ON o.user_id = u.id
+        WHERE o.order_number = %s OR (o.id::text = %s AND %s ~ '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+        GROUP BY o.id, u.email, u.name
+        LIMIT 1
+    """,
+    # A user's 10 newest orders; one row with NULL order fields if they have none
+    "ecom_order_summaries_by_email": """
+        SELECT o.order_number, o.status, o.total_amount
+        FROM users u
+        LEFT JOIN LATERAL (
+            SELECT order_number, status, total_amount, created_at
+            FROM orders
+            WHERE user_id = u.id
+            ORDER BY created_at DESC
+            LIMIT 10
+        ) o ON TRUE
+        WHERE u.email = %s
+        ORDER BY o.created_at DESC
+    """,
+}
+
 class DatabaseTool:
     """
     Unified database tool that works with both Supabase and Local PostgreSQL.
     Same interface, different backend based on configuration.
+    
+    Local PostgreSQL uses one connection per thread, so concurrent queries
+    (prefetch workers, parallel tool calls, batched agent queries) never
+    share a transaction or roll back each other's work.
     """
     
     def __init__(self):
         self.use_supabase = USE_SUPABASE
         self.client = None
-        self.conn = None
+        self._local_available = False
+        self._local = threading.local()
+        self._connections = []  # every thread's connection, closed by close()
+        self._connections_lock = threading.Lock()
         self._initialize()
     
+    @property
+    def conn(self):
+        """This thread's PostgreSQL connection, opened on first use (None in mock mode)"""
+        if not self._local_available:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            try:
+                conn = self._connect()
+            except Exception as e:
+                print(f"[ERROR] Local PostgreSQL connection failed: {e}")
+                return None
+        return conn
+    
+    @property
+    def _prepared(self) -> bool:
+        """Whether PREPARED_QUERIES exist on this thread's connection"""
+        return getattr(self._local, "prepared", False)
+    
+    def _connect(self):
+        """Open and register a connection for the current thread, with the hot lookups prepared"""
+        conn = psycopg2.connect(
+            host=LOCAL_DB_HOST,
+            port=LOCAL_DB_PORT,
+            database=LOCAL_DB_NAME,
+            user=LOCAL_DB_USER,
+            password=LOCAL_DB_PASSWORD
+        )
+        with self._connections_lock:
+            self._connections = [c for c in self._connections if not c.closed]
+            self._connections.append(conn)
+        self._local.conn = conn
+        self._local.prepared = self._prepare_statements(conn)
+        return conn
+    
     def _initialize(self):
         """Initialize database connection based on configuration"""
         if self.use_supabase:
@@ -65,50 +163,68 @@ class DatabaseTool:
             if not PSYCOPG2_AVAILABLE:
                 print("[WARNING] psycopg2 not installed. Install with: pip install psycopg2-binary")
                 return
-            self.conn = psycopg2.connect(
-                host=LOCAL_DB_HOST,
-                port=LOCAL_DB_PORT,
-                database=LOCAL_DB_NAME,
-                user=LOCAL_DB_USER,
-                password=LOCAL_DB_PASSWORD
-            )
+            self._connect()
+            self._local_available = True
             # Use logging instead of print to allow redirection
             import logging
             logger = logging.getLogger(__name__)
-            logger.info(f"Connected to local PostgreSQL: {LOCAL_DB_NAME}")
+            logger.info("Connected to local PostgreSQL: %s", LOCAL_DB_NAME)
         except Exception as e:
             print(f"[WARNING] Local PostgreSQL connection failed: {e}")
             print("[INFO] Running in mock mode - database operations will be simulated")
-            self.conn = None
+            self._local_available = False
     
-    def _execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """Execute query and return results (for local PostgreSQL only)"""
+    @staticmethod
+    def _prepare_statements(conn) -> bool:
+        """PREPARE the hot lookups on a connection; False means use plain queries on it"""
+        try:
+            cursor = conn.cursor()
+            for name, query in PREPARED_QUERIES.items():
+                cursor.execute(f"PREPARE {name}(text) AS {query.replace('%s', '$1')}")
+            cursor.close()
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"[WARNING] Could not prepare statements, using plain queries: {e}")
+            conn.rollback()
+            return False
+    
+    def _execute_query(self, query, params: tuple = None) -> List[Dict[str, Any]]:
+        """Execute query (str or psycopg2.sql.Composed) and return results (for local PostgreSQL only)"""
         if self.use_supabase:
             # Supabase uses its own query methods, not raw SQL
             return []
         
-        if not self.conn:
+        conn = self.conn
+        if not conn:
             return []
         
         try:
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute(query, params)
             
-            if query.strip().upper().startswith('SELECT'):
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
-            else:
-                self.conn.commit()
-                return []
+            # Any statement that produced rows (SELECT or ... RETURNING) is fetched;
+            # anything other than a plain SELECT is committed
+            results = [dict(row) for row in cursor.fetchall()] if cursor.description else []
+            if not (cursor.statusmessage or "").startswith("SELECT"):
+                conn.commit()
+            return results
         except Exception as e:
             print(f"[ERROR] Query execution failed: {e}")
-            if self.conn:
-                self.conn.rollback()
+            if not conn.closed:
+                conn.rollback()
             return []
         finally:
             if 'cursor' in locals():
                 cursor.close()
     
+    def _execute_lookup(self, name: str, value: str) -> List[Dict[str, Any]]:
+        """Run one of PREPARED_QUERIES, via EXECUTE when it was prepared on this thread's connection"""
+        if self.conn and self._prepared:
+            return self._execute_query(f"EXECUTE {name}(%s)", (value,))
+        query = PREPARED_QUERIES[name]
+        return self._execute_query(query, (value,) * query.count("%s"))
+    
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         if self.use_supabase:
@@ -124,23 +240,48 @@ class DatabaseTool:
                 return None
         else:
             # Local PostgreSQL
-            query = "SELECT * FROM users WHERE email = %s LIMIT 1"
-            results = self._execute_query(query, (email,))
+            results = self._execute_lookup("ecom_user_by_email", email)
             return results[0] if results else None
     
-    def get_user_orders(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get user orders with items"""
+    def get_user_orders(self, user_id: str, limit: int = 10,
+                        columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get user orders, newest first.
+        
+        Args:
+            user_id: User UUID
+            limit: Maximum number of orders
+            columns: Order columns to fetch. None (default) returns every column
+                plus the aggregated order_items; a narrow tuple such as
+                ('order_number', 'status', 'total_amount') skips the items join.
+                
+        Returns:
+            List of order dicts
+        """
         if self.use_supabase:
             if not self.client:
                 return self._mock_orders(user_id, limit)
             try:
+                projection = ", ".join(columns) if columns else "*, order_items(*)"
                 response = self.client.table("orders").select(
-                    "*, order_items(*)"
+                    projection
                 ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
                 return response.data if response.data else []
             except Exception as e:
                 print(f"[ERROR] Failed to get orders: {e}")
                 return []
+        elif columns:
+            # Local PostgreSQL - narrow projection, no items aggregation
+            query = sql.SQL("""
+                SELECT {fields}
+                FROM orders o
+                WHERE o.user_id = %s
+                ORDER BY o.created_at DESC
+                LIMIT %s
+            """).format(
+                fields=sql.SQL(", ").join(sql.Identifier("o", column) for column in columns)
+            )
+            return self._execute_query(query, (user_id, limit))
         else:
             # Local PostgreSQL - optimized query with JOIN
             query = """
@@ -168,6 +309,28 @@ class DatabaseTool:
             results = self._execute_query(query, (user_id, limit))
             return results
     
+    def get_order_summaries_by_email(self, email: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a user's 10 newest orders (order_number, status, total_amount) by email.
+        
+        Args:
+            email: User email
+            
+        Returns:
+            List of order dicts, newest first, or None if there is no such user
+        """
+        if self.use_supabase:
+            user = self.get_user_by_email(email)
+            if not user:
+                return None
+            return self.get_user_orders(user["id"], limit=10, columns=("order_number", "status", "total_amount"))
+        
+        # Local PostgreSQL - user lookup and orders in one round trip
+        results = self._execute_lookup("ecom_order_summaries_by_email", email)
+        if not results:
+            return None
+        return [row for row in results if row["order_number"] is not None]
+    
     def get_user_email_from_order(self, order_number: str) -> Optional[str]:
         """Get user email from order number for verification"""
         if self.use_supabase:
@@ -187,14 +350,7 @@ class DatabaseTool:
                 return None
         else:
             # Local PostgreSQL
-            query = """
-                SELECT u.email
-                FROM orders o
-                JOIN users u ON o.user_id = u.id
-                WHERE o.order_number = %s
-                LIMIT 1
-            """
-            results = self._execute_query(query, (order_number,))
+            results = self._execute_lookup("ecom_email_from_order", order_number)
             return results[0]["email"] if results else None
     
     def get_order_by_id(self, order_id: str) -> Optional[Dict[str, Any]]:
@@ -215,33 +371,7 @@ class DatabaseTool:
         else:
             # Local PostgreSQL - optimized query
             # Try order_number first (string), then id (UUID)
-            query = """
-                SELECT 
-                    o.*,
-                    json_agg(
-                        json_build_object(
-                            'id', oi.id,
-                            'product_id', oi.product_id,
-                            'variant_id', oi.variant_id,
-                            'product_name', oi.product_name,
-                            'variant_description', oi.variant_description,
-                            'quantity', oi.quantity,
-                            'unit_price', oi.unit_price,
-                            'total_price', oi.total_price
-                        )
-                    ) as order_items,
-                    json_build_object(
-                        'email', u.email,
-                        'name', u.name
-                    ) as users
-                FROM orders o
-                LEFT JOIN order_items oi ON o.id = oi.order_id
-                LEFT JOIN users u ON o.user_id = u.id
-                WHERE o.order_number = %s OR (o.id::text = %s AND %s ~ '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
-                GROUP BY o.id, u.email, u.name
-                LIMIT 1
-            """
-            results = self._execute_query(query, (order_id, order_id, order_id))
+            results = self._execute_lookup("ecom_order_by_id", order_id)
             return results[0] if results else None
     
     def search_orders_by_status(self, status: str, limit: int = 20) -> List[Dict[str, Any]]:
@@ -306,8 +436,11 @@ class DatabaseTool:
                     metadata = EXCLUDED.metadata,
                     last_updated = EXCLUDED.last_updated
             """
+            conn = self.conn
+            if not conn:
+                return False
             try:
-                cursor = self.conn.cursor()
+                cursor = conn.cursor()
                 cursor.execute(query, (
                     entity_id,
                     entity_type,
@@ -315,11 +448,12 @@ class DatabaseTool:
                     json.dumps(metadata or {}),
                     datetime.now()
                 ))
-                self.conn.commit()
+                conn.commit()
                 cursor.close()
                 return True
             except Exception as e:
                 print(f"[ERROR] Failed to cache entity: {e}")
+                conn.rollback()
                 return False
     
     def get_cached_entity(self, entity_id: str) -> Optional[Dict[str, Any]]:
@@ -402,20 +536,27 @@ class DatabaseTool:
                 SET status = %s, updated_at = %s
                 WHERE id = %s OR order_number = %s
             """
+            conn = self.conn
+            if not conn:
+                return False
             try:
-                cursor = self.conn.cursor()
+                cursor = conn.cursor()
                 cursor.execute(query, (status, datetime.now(), order_id, order_id))
-                self.conn.commit()
+                conn.commit()
                 cursor.close()
                 return cursor.rowcount > 0
             except Exception as e:
                 print(f"[ERROR] Failed to update order: {e}")
+                conn.rollback()
                 return False
     
     def close(self):
-        """Close database connection"""
-        if not self.use_supabase and self.conn:
-            self.conn.close()
+        """Close every thread's database connection"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            if not conn.closed:
+                conn.close()
     
     # Mock methods for testing
     def _mock_user(self, email: str) -> Dict:
@@ -491,14 +632,14 @@ class DatabaseTool:
         if not user_email:
             return None
         
-        # Get user first
-        user = self.get_user_by_email(user_email)
-        if not user:
-            return None
-        
-        user_id = user["id"]
-        
         if self.use_supabase:
+            # Get user first
+            user = self.get_user_by_email(user_email)
+            if not user:
+                return None
+            
+            user_id = user["id"]
+            
             if not self.client:
                 return {"items": [], "total": 0.0, "item_count": 0}
             try:
@@ -546,12 +687,13 @@ class DatabaseTool:
                 print(f"[ERROR] Failed to get cart: {e}")
                 return {"items": [], "total": 0.0, "item_count": 0}
         else:
-            # Local PostgreSQL
+            # Local PostgreSQL - resolve user and cart in one round trip
             if not self.conn:
-                return {"items": [], "total": 0.0, "item_count": 0}
+                return None
             
             query = """
                 SELECT 
+                    u.id as user_id,
                     c.id as cart_id,
                     c.updated_at,
                     ci.id as item_id,
@@ -562,16 +704,20 @@ class DatabaseTool:
                     p.price as product_price,
                     pv.price as variant_price,
                     COALESCE(pv.price, p.price) * ci.quantity as item_total
-                FROM carts c
+                FROM users u
+                LEFT JOIN carts c ON c.user_id = u.id
                 LEFT JOIN cart_items ci ON c.id = ci.cart_id
                 LEFT JOIN products p ON ci.product_id = p.id
                 LEFT JOIN product_variants pv ON ci.variant_id = pv.id
-                WHERE c.user_id = %s
+                WHERE u.email = %s
                 ORDER BY ci.created_at DESC
             """
-            results = self._execute_query(query, (user_id,))
+            results = self._execute_query(query, (user_email,))
             
+            # No rows means no such user; a NULL cart_id means no cart yet
             if not results:
+                return None
+            if not results[0]["cart_id"]:
                 return {"items": [], "total": 0.0, "item_count": 0}
             
             # Group by cart
@@ -602,3 +748,14 @@ class DatabaseTool:
                 "updated_at": results[0].get("updated_at")
             }
 
+_shared_db: Optional[DatabaseTool] = None
+_shared_db_lock = threading.Lock()
+
+def get_db() -> DatabaseTool:
+    """Return the process-wide DatabaseTool, connecting on first use"""
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                _shared_db = DatabaseTool()
+    return _shared_db
@@ -4,7 +4,9 @@ Gmail Tool for 2FA and Notifications
 import smtplib
 import random
 import string
+import threading
 import time
+from contextlib import ExitStack
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Dict, Optional
@@ -23,11 +25,38 @@ class GmailTool:
         self.user = GMAIL_USER
         self.password = GMAIL_APP_PASSWORD
         self.verification_codes: Dict[str, Dict] = {}  # Store codes temporarily
+        # One authenticated SMTP session reused across sends (TLS + login once)
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_stack: Optional[ExitStack] = None
+        self._smtp_lock = threading.Lock()
         
     def _generate_verification_code(self, length: int = 6) -> str:
         """Generate a random verification code"""
         return ''.join(random.choices(string.digits, k=length))
     
+    def _get_smtp(self) -> smtplib.SMTP:
+        """Return the open SMTP session, connecting and logging in if needed"""
+        if self._smtp is None:
+            stack = ExitStack()
+            try:
+                server = stack.enter_context(smtplib.SMTP(self.smtp_server, self.smtp_port))
+                server.starttls()
+                server.login(self.user, self.password)
+            except Exception:
+                stack.close()
+                raise
+            self._smtp, self._smtp_stack = server, stack
+        return self._smtp
+    
+    def close(self):
+        """Close the reused SMTP session, if any"""
+        stack, self._smtp, self._smtp_stack = self._smtp_stack, None, None
+        if stack is not None:
+            try:
+                stack.close()
+            except Exception:
+                pass
+    
     def _send_email(self, to_email: str, subject: str, body: str, is_html: bool = False) -> bool:
         """Send email via SMTP"""
         try:
@@ -45,14 +74,19 @@ class GmailTool:
             else:
                 msg.attach(MIMEText(body, 'plain'))
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.user, self.password)
-                server.send_message(msg)
+            with self._smtp_lock:
+                try:
+                    self._get_smtp().send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # The server dropped the idle session; reconnect once
+                    self.close()
+                    self._get_smtp().send_message(msg)
             
             return True
         except Exception as e:
             print(f"[ERROR] Failed to send email: {e}")
+            with self._smtp_lock:
+                self.close()
             return False
     
     def send_2fa_code(self, email: str, purpose: str = "verification") -> Dict[str, any]:
@@ -6,12 +6,18 @@ Uses subprocess communication for MCP stdio protocol
 import subprocess
 import json
 import sys
+from itertools import count
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 import threading
 import queue
 import time
 
+from ..config import MCP_CALL_TIMEOUT, MCP_EMAIL_CALL_TIMEOUT
+
+class MCPTimeoutError(TimeoutError):
+    """An MCP server did not answer a call in time"""
+
 class SimpleMCPClient:
     """Simple MCP client using subprocess communication"""
     
@@ -19,101 +25,187 @@ class SimpleMCPClient:
         self.server_script = Path(server_script)
         self.process: Optional[subprocess.Popen] = None
         self._connected = False
+        self._lock = threading.Lock()  # one request/response exchange on the pipe at a time
+        self._ids = count(1)
+        # Parsed responses from the reader thread; None marks server exit
+        self._responses: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
     
     def connect(self):
-        """Start MCP server process"""
-        if self._connected:
-            return
-        
-        python_path = sys.executable
-        self.process = subprocess.Popen(
-            [python_path, str(self.server_script)],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=0
-        )
-        self._connected = True
-        time.sleep(0.5)  # Give server time to start
+        """Start MCP server process (again, if the previous one has exited)"""
+        with self._lock:
+            if self._connected and self.process.poll() is None:
+                return
+            
+            python_path = sys.executable
+            self.process = subprocess.Popen(
+                [python_path, str(self.server_script)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE  # binary, buffered pipes; messages are Content-Length framed
+            )
+            # Responses are read on a separate thread so callers can stop waiting
+            self._responses = queue.Queue()
+            threading.Thread(
+                target=self._read_loop,
+                args=(self.process.stdout, self._responses),
+                name=f"mcp-reader-{self.server_script.stem}",
+                daemon=True
+            ).start()
+            self._connected = True
+            time.sleep(0.5)  # Give server time to start
     
     def disconnect(self):
         """Stop MCP server process"""
-        if self.process:
-            self.process.terminate()
-            self.process.wait()
-            self.process = None
-        self._connected = False
+        with self._lock:
+            if self.process:
+                self.process.terminate()
+                self.process.wait()
+                self.process = None
+            self._connected = False
     
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Call a tool on the MCP server"""
-        if not self._connected:
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Call a tool on the MCP server.
+        
+        Args:
+            tool_name: Server method to call
+            arguments: Method parameters
+            timeout: Seconds to wait for the reply (None waits indefinitely)
+        
+        Raises:
+            MCPTimeoutError: No reply within timeout; a late reply is discarded
+        """
+        process = self.process
+        if not self._connected or process is None or process.poll() is not None:
             self.connect()
         
-        # Simple JSON-RPC protocol
-        request = {
-            "jsonrpc": "2.0",
-            "id": int(time.time() * 1000),
-            "method": tool_name,
-            "params": arguments
-        }
+        with self._lock:
+            request_id = next(self._ids)
+            # Simple JSON-RPC protocol
+            request = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": tool_name,
+                "params": arguments
+            }
+            
+            try:
+                body = json.dumps(request).encode("utf-8")
+                self.process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                self.process.stdin.flush()
+            except Exception as e:
+                return {"error": str(e)}
+            
+            response = self._wait_for_response(request_id, tool_name, timeout)
         
-        try:
-            request_json = json.dumps(request) + "\n"
-            self.process.stdin.write(request_json)
-            self.process.stdin.flush()
+        if response is None:
+            return {"error": "No response from server"}
+        
+        if "result" in response:
+            result = response["result"]
+            # Handle error in result
+            if isinstance(result, dict) and "error" in result:
+                return None
+            return result
+        elif "error" in response:
+            error_msg = response["error"].get("message", "Unknown error")
+            return {"error": error_msg}
+        return {"error": "No response from server"}
+    
+    def _wait_for_response(self, request_id: int, tool_name: str, timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Wait for the response to request_id, skipping replies to calls that already timed out"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                response = self._responses.get(timeout=remaining)
+            except queue.Empty:
+                raise MCPTimeoutError(f"MCP call {tool_name} timed out after {timeout}s") from None
             
-            # Read response - skip any log lines, read until we get JSON
-            max_lines = 10
-            response_line = None
+            if response is None:
+                return None  # server exited
+            # Parse errors carry no id; anything else with a different id is stale
+            if response.get("id") in (request_id, None):
+                return response
+    
+    @classmethod
+    def _read_loop(cls, stdout, responses: "queue.Queue"):
+        """Reader thread: parse framed responses into the queue until the server exits"""
+        while True:
+            response_body = cls._read_response(stdout)
+            if response_body is None:
+                responses.put(None)
+                return
+            try:
+                response = json.loads(response_body)
+            except json.JSONDecodeError as e:
+                response = {"id": None, "error": {"message": f"JSON decode error: {e}, response: {response_body[:100]!r}"}}
+            responses.put(response)
+    
+    @staticmethod
+    def _read_response(stdout) -> Optional[bytes]:
+        """Read one Content-Length framed response body, skipping stray output lines"""
+        while True:
+            line = stdout.readline()
+            if not line:
+                return None  # server exited
             
-            for _ in range(max_lines):
-                line = self.process.stdout.readline()
-                if not line:
-                    time.sleep(0.1)
-                    continue
-                
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Skip log lines (they start with [INFO], [WARNING], etc.)
-                if line.startswith('[') and ']' in line:
-                    continue
-                
-                # Try to parse as JSON
-                try:
-                    response = json.loads(line)
-                    if "jsonrpc" in response:  # Valid JSON-RPC response
-                        response_line = line
-                        break
-                except json.JSONDecodeError:
-                    continue
+            # Anything before the header (e.g. [INFO] log lines) is ignored
+            if not line.startswith(b"Content-Length:"):
+                continue
             
-            if response_line:
-                try:
-                    response = json.loads(response_line)
-                    if "result" in response:
-                        result = response["result"]
-                        # Handle error in result
-                        if isinstance(result, dict) and "error" in result:
-                            return None
-                        return result
-                    elif "error" in response:
-                        error_msg = response["error"].get("message", "Unknown error")
-                        return {"error": error_msg}
-                except json.JSONDecodeError as e:
-                    return {"error": f"JSON decode error: {e}, response: {response_line[:100]}"}
-            return {"error": "No response from server"}
-        except Exception as e:
-            return {"error": str(e)}
+            length = int(line.split(b":", 1)[1])
+            while stdout.readline().strip():
+                pass
+            return SimpleMCPClient._read_exact(stdout, length)
+    
+    @staticmethod
+    def _read_exact(stdout, length: int) -> Optional[bytes]:
+        """Read exactly length bytes; a pipe read may return less, so keep reading until EOF"""
+        chunks = []
+        remaining = length
+        while remaining:
+            chunk = stdout.read(remaining)
+            if not chunk:
+                return None  # server exited mid-message
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+# One server process per script, shared by every client in this process
+_shared_clients: Dict[str, SimpleMCPClient] = {}
+_shared_refcounts: Dict[str, int] = {}
+_shared_clients_lock = threading.Lock()
+
+def acquire_shared_client(server_script: str) -> SimpleMCPClient:
+    """Return the process-wide client for a server script, creating it on first use"""
+    key = str(Path(server_script).resolve())
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = _shared_clients[key] = SimpleMCPClient(key)
+        _shared_refcounts[key] = _shared_refcounts.get(key, 0) + 1
+        return client
+
+def release_shared_client(client: SimpleMCPClient):
+    """Drop one reference to a shared client; the last one stops its server"""
+    key = str(client.server_script)
+    with _shared_clients_lock:
+        remaining = _shared_refcounts.get(key, 0) - 1
+        if remaining > 0:
+            _shared_refcounts[key] = remaining
+            return
+        _shared_refcounts.pop(key, None)
+        _shared_clients.pop(key, None)
+    client.disconnect()
 
 class PostgreSQLMCPClient:
     """MCP client for PostgreSQL operations - synchronous"""
     
     def __init__(self):
         server_path = Path(__file__).parent.parent.parent / "mcp_servers" / "postgresql_server.py"
-        self.client = SimpleMCPClient(str(server_path))
+        self.client = acquire_shared_client(str(server_path))
+        self.timeout = MCP_CALL_TIMEOUT  # seconds per call; MCPTimeoutError lets callers fall back
         self._connected = False
     
     def _ensure_connected(self):
@@ -125,19 +217,19 @@ class PostgreSQLMCPClient:
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         self._ensure_connected()
-        result = self.client.call_tool("get_user_by_email", {"email": email})
+        result = self.client.call_tool("get_user_by_email", {"email": email}, timeout=self.timeout)
         return result if result and "error" not in result else None
     
     def get_user_orders(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get user orders"""
         self._ensure_connected()
-        result = self.client.call_tool("get_user_orders", {"user_id": user_id, "limit": limit})
+        result = self.client.call_tool("get_user_orders", {"user_id": user_id, "limit": limit}, timeout=self.timeout)
         return result if isinstance(result, list) else []
     
     def get_order_by_id(self, order_id: str) -> Optional[Dict[str, Any]]:
         """Get order by ID"""
         self._ensure_connected()
-        result = self.client.call_tool("get_order_by_id", {"order_id": order_id})
+        result = self.client.call_tool("get_order_by_id", {"order_id": order_id}, timeout=self.timeout)
         # Check if result has error key (which means order not found)
         if result and isinstance(result, dict):
             if "error" in result:
@@ -148,30 +240,32 @@ class PostgreSQLMCPClient:
     def get_user_email_from_order(self, order_number: str) -> Optional[str]:
         """Get user email from order number"""
         self._ensure_connected()
-        result = self.client.call_tool("get_user_email_from_order", {"order_number": order_number})
+        result = self.client.call_tool("get_user_email_from_order", {"order_number": order_number}, timeout=self.timeout)
         return result.get("email") if result and "error" not in result else None
     
     def search_orders_by_status(self, status: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Search orders by status"""
         self._ensure_connected()
-        result = self.client.call_tool("search_orders_by_status", {"status": status, "limit": limit})
+        result = self.client.call_tool("search_orders_by_status", {"status": status, "limit": limit}, timeout=self.timeout)
         return result if isinstance(result, list) else []
     
     def update_order_status(self, order_id: str, status: str) -> bool:
         """Update order status"""
         self._ensure_connected()
-        result = self.client.call_tool("update_order_status", {"order_id": order_id, "status": status})
+        result = self.client.call_tool("update_order_status", {"order_id": order_id, "status": status}, timeout=self.timeout)
         return result.get("success", False) if result else False
     
     def create_user(self, email: str, name: str) -> Optional[Dict[str, Any]]:
         """Create user"""
         self._ensure_connected()
-        result = self.client.call_tool("create_user", {"email": email, "name": name})
+        result = self.client.call_tool("create_user", {"email": email, "name": name}, timeout=self.timeout)
         return result if result and "error" not in result else None
     
     def close(self):
-        """Close connection"""
-        self.client.disconnect()
+        """Release the shared server connection"""
+        if self.client is not None:
+            release_shared_client(self.client)
+            self.client = None
         self._connected = False
 
 class GmailMCPClient:
@@ -179,7 +273,8 @@ class GmailMCPClient:
     
     def __init__(self):
         server_path = Path(__file__).parent.parent.parent / "mcp_servers" / "gmail_server.py"
-        self.client = SimpleMCPClient(str(server_path))
+        self.client = acquire_shared_client(str(server_path))
+        self.timeout = MCP_EMAIL_CALL_TIMEOUT  # seconds per call; MCPTimeoutError lets callers fall back
         self._connected = False
     
     def _ensure_connected(self):
@@ -191,13 +286,13 @@ class GmailMCPClient:
     def send_2fa_code(self, email: str, purpose: str = "verification") -> Dict[str, Any]:
         """Send 2FA code"""
         self._ensure_connected()
-        result = self.client.call_tool("send_2fa_code", {"email": email, "purpose": purpose})
+        result = self.client.call_tool("send_2fa_code", {"email": email, "purpose": purpose}, timeout=self.timeout)
         return result if result else {"success": False, "error": "Unknown error"}
     
     def verify_2fa_code(self, email: str, code: str) -> Dict[str, Any]:
         """Verify 2FA code"""
         self._ensure_connected()
-        result = self.client.call_tool("verify_2fa_code", {"email": email, "code": code})
+        result = self.client.call_tool("verify_2fa_code", {"email": email, "code": code}, timeout=self.timeout)
         return result if result else {"verified": False, "error": "Unknown error"}
     
     def send_notification(self, email: str, notification_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -207,16 +302,18 @@ class GmailMCPClient:
             "email": email,
             "notification_type": notification_type,
             "data": data
-        })
+        }, timeout=self.timeout)
         return result if result else {"success": False, "error": "Unknown error"}
     
     def cleanup_expired_codes(self):
         """Cleanup expired codes"""
         self._ensure_connected()
-        self.client.call_tool("cleanup_expired_codes", {})
+        self.client.call_tool("cleanup_expired_codes", {}, timeout=self.timeout)
     
     def close(self):
-        """Close connection"""
-        self.client.disconnect()
+        """Release the shared server connection"""
+        if self.client is not None:
+            release_shared_client(self.client)
+            self.client = None
         self._connected = False
 
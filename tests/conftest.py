@@ -0,0 +1,24 @@
+"""
+Shared pytest fixtures
+"""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.agent.ecommerce_agent import ECommerceAgent
+
+@pytest.fixture(scope="session")
+def shared_agent():
+    """Initialize one agent for the whole test run and release its servers and workers afterwards"""
+    agent = ECommerceAgent()
+    yield agent
+    agent.close()
+
+@pytest.fixture
+def agent(shared_agent):
+    """Reuse the shared agent with a clean default thread and empty caches"""
+    shared_agent.reset_thread()
+    shared_agent.clear_caches()
+    return shared_agent
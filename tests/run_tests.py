@@ -16,10 +16,13 @@ def run_all_tests():
     
     # Add all test modules
     test_modules = [
+        'tests.test_agent_cache',
         'tests.test_config',
         'tests.test_generator',
+        'tests.test_json_utils',
         'tests.test_minirag_graph_builder',
         'tests.test_minirag_graph_retriever',
+        'tests.test_tools_database',
         'tests.test_tools_gmail',
         'tests.test_tools_supabase'
     ]
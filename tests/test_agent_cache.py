@@ -0,0 +1,78 @@
+"""
+Unit tests for the agent-layer TTL/LRU cache
+"""
+import unittest
+from unittest.mock import patch
+import pathlib
+
+import sys
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from src.agent.cache import TTLCache, query_signature
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for TTLCache"""
+    
+    def test_get_and_set(self):
+        """Test stored values are returned and missing keys give the default"""
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.get("missing", "x"), "x")
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+    
+    def test_expiry(self):
+        """Test entries expire after the TTL"""
+        cache = TTLCache(maxsize=4, ttl=10)
+        with patch("src.agent.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("src.agent.cache.time.monotonic", return_value=105.0):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("src.agent.cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+    
+    def test_pop_and_clear(self):
+        """Test explicit invalidation"""
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.get("a"))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+    
+    def test_stats(self):
+        """Test hit/miss counting"""
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(cache.stats(), {"size": 1, "hits": 1, "misses": 1})
+    
+    def test_query_signature_near_duplicates(self):
+        """Test rewordings of the same question share a signature"""
+        self.assertEqual(query_signature("What is your return policy?"),
+                         query_signature("return policy, please"))
+        self.assertEqual(query_signature("Can you tell me the return policy"),
+                         query_signature("RETURN POLICY"))
+        self.assertNotEqual(query_signature("What is the shipping cost?"),
+                            query_signature("What is the shipping time?"))
+        self.assertEqual(query_signature("Hello, thanks!"), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 """
 Comprehensive Unit and Functional Tests for Order Tracking Agent
 """
+import asyncio
 import pytest
 import sys
 from pathlib import Path
@@ -8,19 +9,18 @@ from pathlib import Path
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.agent.ecommerce_agent import ECommerceAgent
+from src.agent.ecommerce_agent import NoteContext, build_context_notes, _tool_call_signature
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from src.tools.database_tool import DatabaseTool
 from src.tools.gmail_tool import GmailTool
+from src.tools.mcp_client import MCPTimeoutError
+from src.generator import NO_CONTEXT_ANSWER
 import time
 
 class TestOrderTracking:
     """Test suite for order tracking functionality"""
     
-    @pytest.fixture
-    def agent(self):
-        """Initialize agent for testing"""
-        return ECommerceAgent()
-    
     @pytest.fixture
     def db_tool(self):
         """Initialize database tool"""
@@ -211,6 +211,226 @@ class TestOrderTracking:
         answer = result["answer"].lower()
         assert "not found" in answer or "couldn't find" in answer or "invalid" in answer
 
+    def test_empty_query_short_circuit(self, agent):
+        """Test 13: Empty or whitespace query is answered without running the workflow"""
+        for query in ["", "   "]:
+            result = agent.process_query(query=query, user_email=None)
+            assert result["answer"] == "Please enter a question."
+            assert result["iterations"] == 0
+            assert result["debug_info"]["tool_calls"] == []
+    
+    def test_aprocess_query_concurrent(self, agent):
+        """Test 14: Async queries on separate threads can be gathered"""
+        async def run_all():
+            return await asyncio.gather(*(
+                agent.aprocess_query(query="  ", thread_id=f"async-{i}") for i in range(3)
+            ))
+        
+        results = asyncio.run(run_all())
+        assert len(results) == 3
+        assert all(result["steps"] == "empty_query" for result in results)
+    
+    def test_direct_faq_routing(self, agent):
+        """Test 15: Plain policy FAQs skip the reason step; personal queries do not"""
+        retrieved = [{"title": "Return and Refund Policy", "score": 7.8}]
+        
+        faq_state = {"query": "What is your return policy?", "retrieved_context": retrieved}
+        assert agent._route_after_retrieve(faq_state) == "generate"
+        
+        order_state = {"query": "return policy for ORD-12345", "retrieved_context": retrieved}
+        assert agent._route_after_retrieve(order_state) == "reason"
+        
+        vague_state = {"query": "How long does it take to get my money back?", "retrieved_context": retrieved}
+        assert agent._route_after_retrieve(vague_state) == "reason"
+    
+    def test_action_only_query_classification(self, agent):
+        """Test 16: Action-only queries skip retrieval; policy questions never do"""
+        for query in ["ORD-12345", "123456", "send me my 2FA code", "what's in my cart?"]:
+            assert agent._is_action_only(query), query
+        for query in ["What is your return policy?", "refund policy for ORD-12345", "track order ORD-12345"]:
+            assert not agent._is_action_only(query), query
+    
+    def test_clean_messages_pairing(self, agent):
+        """Test 17: Only fully answered tool calls survive message cleaning"""
+        answered = AIMessage(content="", tool_calls=[{"name": "get_order", "args": {}, "id": "a"}])
+        unanswered = AIMessage(content="", tool_calls=[{"name": "get_order", "args": {}, "id": "b"}])
+        messages = [
+            ToolMessage(content="orphan", tool_call_id="x"),
+            HumanMessage(content="track ORD-12345"),
+            answered,
+            ToolMessage(content="shipped", tool_call_id="a"),
+            unanswered,
+            HumanMessage(content="thanks"),
+            AIMessage(content="You're welcome")
+        ]
+        
+        cleaned = agent._clean_messages(messages)
+        assert cleaned == [messages[1], answered, messages[3], messages[5], messages[6]]
+    
+    def test_rule_match_skips_planner(self, agent, monkeypatch):
+        """Test 18: The planner only runs when no routing rule matches"""
+        planned = []
+        prompts = []
+        monkeypatch.setattr(agent.planning_module, "plan_action_sequence",
+                            lambda **kwargs: planned.append(kwargs["query"]) or {"primary_action": "retrieve_policy"})
+        monkeypatch.setattr(agent, "llm_with_tools", type("LLM", (), {
+            "invoke": lambda self, messages: prompts.append(messages[1].content) or AIMessage(content="ok")
+        })())
+        
+        agent._reason_node({"query": "Where is ORD-12345?", "messages": []})
+        assert planned == []
+        assert "Primary Action: tool_call" in prompts[-1]
+        
+        # Keyword-only order mentions and return/refund questions still go through the planner
+        for query in ["Do you ship internationally?", "How do I return an order?",
+                      "order cancellation policy", "refund for ORD-12345"]:
+            agent._reason_node({"query": query, "messages": []})
+            assert planned[-1] == query
+            assert "Primary Action: retrieve_policy" in prompts[-1]
+    
+    def test_astream_query(self, agent, monkeypatch):
+        """Test 19: Generated answers stream in pieces; other answers arrive whole"""
+        answer = "Returns are accepted within 30 days of delivery."
+        monkeypatch.setattr(agent, "answer_llm", GenericFakeChatModel(messages=iter([AIMessage(content=answer)])))
+        agent.response_cache.clear()
+        
+        async def collect(query, **kwargs):
+            return [part async for part in agent.astream_query(query, **kwargs)]
+        
+        parts = asyncio.run(collect("What is the return policy?", thread_id=None))
+        assert len(parts) > 1
+        assert "".join(parts) == answer
+        
+        assert asyncio.run(collect("   ")) == ["Please enter a question."]
+    
+    def test_context_note_rules(self):
+        """Test 20: Context notes follow login, verification and prefetch state"""
+        base = NoteContext(
+            user_email="", verified_email=None, remembered_order=None, order_number="ORD-12345",
+            refers_to_remembered=False, is_all_orders_query=False, is_categories_query=False,
+            is_cart_query=False, is_order_tracking=True, is_process_query=False, prefetched=False,
+            process="process", code=None, email_to_verify=None
+        )
+        
+        notes = build_context_notes(base)
+        assert "NOT LOGGED IN" in notes[0]
+        assert "get_user_email_from_order tool with order_number='ORD-12345'" in notes[1]
+        
+        logged_in = base._replace(user_email="john@example.com", remembered_order="ORD-12345", prefetched=True)
+        notes = build_context_notes(logged_in)
+        assert "ORDER DETAILS above" in notes[0]
+        assert notes[1].startswith("[ORDER DETAILS for ORD-12345")
+        
+        cart = logged_in._replace(is_cart_query=True)
+        assert "get_cart" in build_context_notes(cart)[0]
+        assert not any("ORDER DETAILS above" in note for note in build_context_notes(cart))
+        
+        code = base._replace(order_number=None, is_order_tracking=False, code="123456", email_to_verify="john@example.com")
+        assert build_context_notes(code) == [
+            "[ACTION REQUIRED: User provided verification code 123456. You MUST call verify_2fa_code tool with email='john@example.com' and code='123456'.]"
+        ]
+    
+    def test_reason_llm_cache(self, agent, monkeypatch):
+        """Test 21: Identical reasoning prompts reuse the reply with fresh tool call ids"""
+        calls = []
+        reply = AIMessage(content="", tool_calls=[{"name": "get_order", "args": {"order_id": "ORD-12345"}, "id": "call_1"}])
+        monkeypatch.setattr(agent, "llm_with_tools", type("LLM", (), {"invoke": lambda self, messages: calls.append(messages) or reply})())
+        agent.llm_cache.clear()
+        prompt = [HumanMessage(content="Where is ORD-12345?")]
+        
+        first = agent._invoke_reason_llm(prompt)
+        second = agent._invoke_reason_llm(prompt)
+        assert len(calls) == 1
+        assert second.tool_calls[0]["args"] == {"order_id": "ORD-12345"}
+        assert second.tool_calls[0]["id"] != first.tool_calls[0]["id"]
+        
+        agent._invoke_reason_llm(prompt, cacheable=False)
+        agent._invoke_reason_llm([HumanMessage(content="Where is ORD-67890?")])
+        assert len(calls) == 3
+    
+    def test_batch_process_queries(self, agent, monkeypatch):
+        """Test 22: Batched queries keep input order and run each thread's queries in sequence"""
+        seen = []
+        
+        def fake_process_query(query, user_email=None, conversation_history=None, thread_id="default", on_token=None):
+            seen.append((thread_id, query))
+            time.sleep(0.05 if query == "first" else 0)
+            return {"answer": f"{query}:{user_email}"}
+        
+        monkeypatch.setattr(agent, "process_query", fake_process_query)
+        results = agent.batch_process_queries([
+            ("first", "a@example.com", "t1"),
+            ("other", None, None),
+            ("second", "a@example.com", "t1"),
+        ], max_concurrency=4)
+        
+        assert [r["answer"] for r in results] == ["first:a@example.com", "other:None", "second:a@example.com"]
+        t1_order = [query for thread_id, query in seen if thread_id == "t1"]
+        assert t1_order == ["first", "second"]
+        # The stateless query did not wait behind thread t1
+        assert seen.index((None, "other")) < seen.index(("t1", "second"))
+    
+    def test_repeated_tool_call_loop_detection(self, agent):
+        """Test 23: Requesting the tool calls just made, with the same arguments, ends the loop"""
+        calls = [{"name": "get_order", "args": {"order_id": "ORD-12345", "user_email": None}, "id": "call_1"}]
+        reordered = [{"name": "get_order", "args": {"user_email": None, "order_id": "ORD-12345"}, "id": "call_2"}]
+        assert _tool_call_signature(calls) == _tool_call_signature(reordered)
+        
+        state = {
+            "messages": [HumanMessage(content="Where is ORD-12345?"), AIMessage(content="", tool_calls=reordered)],
+            "query": "Where is ORD-12345?",
+            "user_email": "",
+            "recent_tool_signatures": [_tool_call_signature(calls)],
+        }
+        assert agent._should_use_tools(state) == "generate"
+        
+        state["recent_tool_signatures"] = [_tool_call_signature([{**calls[0], "args": {"order_id": "ORD-67890"}}])]
+        assert agent._should_use_tools(state) == "tools"
+    
+    def test_gmail_timeout_no_fallback(self, agent, monkeypatch):
+        """Test 24: A Gmail MCP timeout is reported instead of retried through the direct tool"""
+        def timeout(*args, **kwargs):
+            raise MCPTimeoutError("timed out")
+        
+        def fallback(*args, **kwargs):
+            raise AssertionError("direct Gmail tool must not be used after a timeout")
+        
+        monkeypatch.setattr(agent.gmail_mcp, "send_2fa_code", timeout)
+        monkeypatch.setattr(agent.gmail_mcp, "verify_2fa_code", timeout)
+        monkeypatch.setattr(agent.gmail_tool, "send_2fa_code", fallback)
+        monkeypatch.setattr(agent.gmail_tool, "verify_2fa_code", fallback)
+        tools = {t.name: t for t in agent.tools}
+        
+        assert "timed out" in tools["send_2fa_code"].invoke({"email": "john@example.com"})
+        assert "timed out" in tools["verify_2fa_code"].invoke({"email": "john@example.com", "code": "123456"})
+    
+    def test_generate_from_tool_results_without_context(self, agent, monkeypatch):
+        """Test 25: Action-only turns answer from tool results; only no context and no results gives the fallback"""
+        prompts = []
+        monkeypatch.setattr(agent, "answer_llm", type("LLM", (), {
+            "invoke": lambda self, messages: prompts.append(messages) or AIMessage(content="Your cart has 1 item: Mens Blue Jeans.")
+        })())
+        query = "what's in my cart?"
+        state = {
+            "query": query,
+            "retrieved_context": [],
+            "user_email": "john@example.com",
+            "messages": [
+                HumanMessage(content=query),
+                AIMessage(content="", tool_calls=[{"name": "get_cart", "args": {"user_email": "john@example.com"}, "id": "call_1"}]),
+                ToolMessage(content="Cart: 1 item - Mens Blue Jeans x1 ($79.99)", name="get_cart", tool_call_id="call_1"),
+                AIMessage(content="Here is your cart."),
+            ],
+        }
+        
+        result = agent._generate_node(state)
+        assert result["messages"][-1].content == "Your cart has 1 item: Mens Blue Jeans."
+        assert "Mens Blue Jeans x1" in prompts[0][-1]["content"]
+        
+        empty = {"query": query, "retrieved_context": [], "user_email": "", "messages": [HumanMessage(content=query)]}
+        assert agent._generate_node(empty)["messages"][-1].content == NO_CONTEXT_ANSWER
+        assert len(prompts) == 1
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "-s"])
 
@@ -8,17 +8,12 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.agent.ecommerce_agent import ECommerceAgent
 from src.tools.database_tool import DatabaseTool
 from src.tools.gmail_tool import GmailTool
 
 class TestIntegrationOrderTracking:
     """Integration tests for complete order tracking scenarios"""
     
-    @pytest.fixture
-    def agent(self):
-        return ECommerceAgent()
-    
     @pytest.fixture
     def db_tool(self):
         return DatabaseTool()
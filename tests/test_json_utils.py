@@ -0,0 +1,52 @@
+"""
+Unit tests for the shared JSON helpers
+"""
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+from uuid import UUID
+import pathlib
+
+import sys
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from src import json_utils
+from src.json_utils import dumps, loads
+
+
+class TestJsonUtils(unittest.TestCase):
+    """Test cases for dumps/loads"""
+    
+    VALUE = {
+        "when": datetime(2026, 1, 1, 1, 2, 3),
+        "total": Decimal("59.98"),
+        "id": UUID(int=1),
+        "name": "Zoë"
+    }
+    
+    def test_database_values(self):
+        """Test datetimes are ISO 8601 and Decimal/UUID become float/str"""
+        self.assertEqual(loads(dumps(self.VALUE)), {
+            "when": "2026-01-01T01:02:03",
+            "total": 59.98,
+            "id": "00000000-0000-0000-0000-000000000001",
+            "name": "Zoë"
+        })
+    
+    def test_unknown_type(self):
+        """Test unknown types raise unless a default is given"""
+        with self.assertRaises(TypeError):
+            dumps({"path": pathlib.PurePosixPath("/tmp/x")})
+        self.assertEqual(dumps({"path": pathlib.PurePosixPath("/tmp/x")}, default=str), b'{"path":"/tmp/x"}')
+    
+    def test_same_output_without_orjson(self):
+        """Test the json fallback writes the same bytes as the active encoder"""
+        for indent in (False, True):
+            expected = dumps(self.VALUE, indent=indent)
+            with patch.object(json_utils, "ORJSON_AVAILABLE", False):
+                self.assertEqual(dumps(self.VALUE, indent=indent), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,10 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.tools.mcp_client import PostgreSQLMCPClient, GmailMCPClient
+from src.tools.mcp_client import (
+    PostgreSQLMCPClient, GmailMCPClient, SimpleMCPClient, MCPTimeoutError,
+    acquire_shared_client, release_shared_client
+)
 import time
 
 class TestPostgreSQLMCP:
@@ -49,6 +52,69 @@ class TestPostgreSQLMCP:
         orders = client.search_orders_by_status("shipped", limit=5)
         assert isinstance(orders, list)
 
+class TestSharedMCPClient:
+    """Test server processes are shared between MCP clients"""
+    
+    def test_clients_share_one_server(self):
+        """Test two clients reuse one server process"""
+        first = PostgreSQLMCPClient()
+        second = PostgreSQLMCPClient()
+        assert second.client is first.client
+        first.close()
+        second.close()
+    
+    def test_last_release_drops_client(self, tmp_path):
+        """Test the shared client is only dropped once every user released it"""
+        script = str(tmp_path / "server.py")
+        first = acquire_shared_client(script)
+        second = acquire_shared_client(script)
+        assert second is first
+        
+        release_shared_client(first)
+        assert acquire_shared_client(script) is first
+        release_shared_client(first)
+        release_shared_client(first)
+        fresh = acquire_shared_client(script)
+        assert fresh is not first
+        release_shared_client(fresh)
+
+class TestMCPTimeout:
+    """Test calls to a slow MCP server time out without desynchronizing the pipe"""
+    
+    SERVER = """
+import sys, time
+sys.path.insert(0, {root!r})
+from mcp_servers.simple_rpc_server import SimpleRPCServer
+SimpleRPCServer({{
+    "slow": lambda: time.sleep(1) or "late",
+    "echo": lambda value: value,
+    "big": lambda size: "x" * size,
+}}).run()
+"""
+    
+    def test_timeout_then_next_call(self, tmp_path):
+        """Test a timed-out call raises and the late reply is not handed to the next call"""
+        script = tmp_path / "slow_server.py"
+        script.write_text(self.SERVER.format(root=str(Path(__file__).parent.parent)))
+        client = SimpleMCPClient(str(script))
+        try:
+            with pytest.raises(MCPTimeoutError):
+                client.call_tool("slow", {}, timeout=0.2)
+            assert client.call_tool("echo", {"value": "fresh"}, timeout=5) == "fresh"
+        finally:
+            client.disconnect()
+    
+    def test_large_reply(self, tmp_path):
+        """Test a reply larger than one pipe read (64 KiB) arrives whole and keeps the stream in sync"""
+        script = tmp_path / "big_server.py"
+        script.write_text(self.SERVER.format(root=str(Path(__file__).parent.parent)))
+        client = SimpleMCPClient(str(script))
+        try:
+            assert client.call_tool("big", {"size": 300_000}, timeout=10) == "x" * 300_000
+            assert client.call_tool("echo", {"value": "next"}, timeout=5) == "next"
+        finally:
+            client.disconnect()
+
 class TestGmailMCP:
     """Test Gmail MCP client"""
     
@@ -101,6 +101,17 @@ class TestMiniRAGRetriever(unittest.TestCase):
         self.assertIsInstance(keywords, set)
         self.assertIn("value", keywords)
     
+    def test_node_index_follows_graph(self):
+        """Test the match index is rebuilt when the graph is replaced"""
+        self.retriever.graph = self.mock_graph
+        policies, entities = self.retriever._node_index()
+        self.assertEqual([node for node, *_ in policies], ["policy::return_refund"])
+        self.assertIn("30", policies[0][3])
+        self.assertEqual(entities, [("entity::product_categories::Electronics", "electronics")])
+        
+        self.retriever.graph = nx.MultiDiGraph()
+        self.assertEqual(self.retriever._node_index(), ([], []))
+    
     def test_retrieve_with_valid_graph(self):
         """Test full retrieval with valid graph"""
         self.retriever.graph = self.mock_graph
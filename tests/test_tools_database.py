@@ -0,0 +1,76 @@
+"""
+Unit tests for the unified Database Tool's local PostgreSQL connections
+"""
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+import pathlib
+
+import sys
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from src.tools.database_tool import DatabaseTool
+
+
+def _fake_connect(**kwargs):
+    """A connection double that is open until close() is called"""
+    conn = MagicMock()
+    conn.closed = 0
+    conn.close.side_effect = lambda: setattr(conn, "closed", 1)
+    return conn
+
+
+class TestDatabaseToolConnections(unittest.TestCase):
+    """Test each thread gets its own connection (and so its own transaction)"""
+    
+    def setUp(self):
+        """Build a local-PostgreSQL tool against fake connections"""
+        patcher = patch("src.tools.database_tool.psycopg2.connect", side_effect=_fake_connect)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        with patch("src.tools.database_tool.USE_SUPABASE", False):
+            self.db = DatabaseTool()
+    
+    def test_connection_per_thread(self):
+        """Test a thread reuses its connection and other threads open their own"""
+        main_conn = self.db.conn
+        self.assertIs(self.db.conn, main_conn)
+        self.assertTrue(self.db._prepared)
+        
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db.conn))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], main_conn)
+        self.assertEqual(self.connect.call_count, 2)
+    
+    def test_failed_query_rolls_back_only_its_connection(self):
+        """Test an error rolls back the failing thread's transaction only"""
+        main_conn = self.db.conn
+        failed = {}
+        
+        def fail():
+            conn = failed["conn"] = self.db.conn
+            conn.cursor.return_value.execute.side_effect = RuntimeError("boom")
+            failed["result"] = self.db._execute_query("SELECT 1")
+        
+        thread = threading.Thread(target=fail)
+        thread.start()
+        thread.join()
+        self.assertEqual(failed["result"], [])
+        failed["conn"].rollback.assert_called_once()
+        main_conn.rollback.assert_not_called()
+    
+    def test_close_closes_every_connection(self):
+        """Test close() closes connections opened by all threads"""
+        conns = [self.db.conn]
+        thread = threading.Thread(target=lambda: conns.append(self.db.conn))
+        thread.start()
+        thread.join()
+        
+        self.db.close()
+        self.assertTrue(all(conn.closed for conn in conns))
+
+
+if __name__ == '__main__':
+    unittest.main()